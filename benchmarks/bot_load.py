@@ -0,0 +1,339 @@
+# benchmarks/bot_load.py
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест бота целиком: сколько апдейтов в секунду держит один процесс.
+
+Запуск из корня проекта:
+    python -m benchmarks.bot_load [--users 2000] [--concurrency 200] [--think 0.2]
+        [--redis-url redis://localhost:6379/15] [--json out.json]
+
+Каждый синтетический пользователь проходит диалог:
+    /start → lang_* → геопозиция → radius_* → rating_* (поиск)
+Апдейты идут в настоящий Dispatcher из bot_context (middleware, FSM в Redis,
+I18n, хендлеры, OutboundScheduler), но:
+- Bot API — FakeSession: отвечает на методы бота с задержкой --send-latency;
+- провайдеры мест — заглушки search_bench.StubTransport (профиль NORMAL);
+- Redis — fakeredis (или --redis-url, база очищается);
+- flood-лимиты Telegram по умолчанию сняты, чтобы мерить сам процесс
+  (--telegram-limits — оставить TG_* из настроек).
+
+Отчёт:
+- задержка каждого шага (feed_update целиком) p50/p95/p99;
+- апдейтов в секунду;
+- лаг event loop (насколько опаздывает sleep(LAG_INTERVAL)), p50/p99/max;
+- команд Redis и обращений к Redis (round trip) на апдейт, топ команд;
+- вызовов Bot API на апдейт.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update
+
+from benchmarks.search_bench import CENTER, NORMAL, StubTransport, _connect, _git_commit, _percentile
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Bench Bot"}
+FIRST_USER_ID = 10_000
+LAG_INTERVAL = 0.01   # период замера лага event loop, секунды
+
+STEPS = ("start", "lang", "location", "radius", "rating")
+LANGS = ("ru", "en", "zh")
+RADII = (50, 100, 200)
+RATINGS = ("4.0_4.5", "4.41_4.7", "4.71_5.0")
+
+# Нужны Settings() при импорте bot.main; настоящие ключи тесту не нужны
+_BENCH_ENV = {
+    "BOT_TOKEN": "123456:bench-token",
+    "FSQ_API_KEY": "fsq-key",
+    "MAPBOX_TOKEN": "mapbox-token",
+    "VIETMAP_API_KEY": "vietmap-key",
+    "ADMIN_ID": "1",
+}
+
+
+class FakeSession(BaseSession):
+    """Bot API без сети: методы с chat_id возвращают Message, остальные — True."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return True
+        return Message(
+            message_id=getattr(method, "message_id", None) or next(self._message_ids),
+            date=int(time.time()),
+            chat=Chat(id=chat_id, type="private"),
+            from_user=BOT_USER,
+            text=getattr(method, "text", None),
+        ).as_(bot)
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError("FakeSession does not download files")
+        yield b""  # pragma: no cover
+
+    async def close(self) -> None:
+        pass
+
+
+def _counting(connection_class):
+    """Класс соединения Redis, считающий команды и обращения (round trip)."""
+
+    class CountingConnection(connection_class):
+        commands: Counter = Counter()
+
+        def pack_command(self, *args):
+            name = args[0]
+            if isinstance(name, bytes):
+                name = name.decode()
+            CountingConnection.commands[str(name).split()[0].upper()] += 1
+            return super().pack_command(*args)
+
+        async def send_packed_command(self, command, check_health: bool = True):
+            CountingConnection.commands["_round_trips"] += 1
+            return await super().send_packed_command(command, check_health)
+
+    return CountingConnection
+
+
+# --- Синтетические апдейты ---
+
+class SyntheticUser:
+    """Один пользователь: апдейты шагов диалога."""
+
+    _update_ids = itertools.count(1)
+    _message_ids = itertools.count(1_000_000)
+
+    def __init__(self, user_id: int, rnd: random.Random, spread_km: float):
+        self.user_id = user_id
+        self.rnd = rnd
+        self.spread_km = spread_km
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+
+    def _message(self, **fields) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": self.chat,
+            "from": self.user,
+            **fields,
+        }
+
+    def _callback(self, data: str) -> Dict[str, Any]:
+        return {
+            "id": str(next(self._message_ids)),
+            "from": self.user,
+            "chat_instance": f"bench-{self.user_id}",
+            "data": data,
+            "message": {**self._message(text="…"), "from": BOT_USER},
+        }
+
+    def update(self, step: str) -> Dict[str, Any]:
+        update: Dict[str, Any] = {"update_id": next(self._update_ids)}
+        if step == "start":
+            update["message"] = self._message(
+                text="/start", entities=[{"type": "bot_command", "offset": 0, "length": 6}],
+            )
+        elif step == "lang":
+            update["callback_query"] = self._callback(f"lang_{self.rnd.choice(LANGS)}")
+        elif step == "location":
+            r = self.spread_km * 1000 * math.sqrt(self.rnd.random())
+            a = self.rnd.uniform(0, 2 * math.pi)
+            update["message"] = self._message(location={
+                "latitude": CENTER[0] + r * math.cos(a) / 111_320,
+                "longitude": CENTER[1] + r * math.sin(a) / (111_320 * math.cos(math.radians(CENTER[0]))),
+            })
+        elif step == "radius":
+            update["callback_query"] = self._callback(f"radius_{self.rnd.choice(RADII)}")
+        else:
+            update["callback_query"] = self._callback(f"rating_{self.rnd.choice(RATINGS)}")
+        return update
+
+
+# --- Прогон ---
+
+async def _loop_lag(samples: List[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(loop.time() - started - LAG_INTERVAL)
+
+
+async def run(
+    users: int,
+    concurrency: int,
+    think: float,
+    send_latency: float,
+    spread_km: float,
+    redis_url: Optional[str] = None,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    from bot.main import bot_context  # после настройки окружения в main()
+
+    redis_conn = await _connect(redis_url, flush=True)
+    counting = _counting(redis_conn.connection_pool.connection_class)
+    redis_conn.connection_pool.connection_class = counting
+
+    session = FakeSession(latency=send_latency)
+    transport = StubTransport(NORMAL, seed=seed)
+    rnd = random.Random(seed)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    lag: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with bot_context(redis_conn=redis_conn, session=session, transport=transport) as (bot, dp):
+        async def dialog(user: SyntheticUser) -> None:
+            async with semaphore:
+                for step in STEPS:
+                    if think:
+                        await asyncio.sleep(rnd.uniform(0, think))
+                    update = Update.model_validate(user.update(step), context={"bot": bot})
+                    started = time.perf_counter()
+                    try:
+                        await dp.feed_update(bot, update)
+                    except Exception as e:
+                        errors[f"{step}: {type(e).__name__}"] += 1
+                    latencies[step].append(time.perf_counter() - started)
+
+        monitor = asyncio.create_task(_loop_lag(lag))
+        counting.commands.clear()
+        session.calls.clear()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                dialog(SyntheticUser(FIRST_USER_ID + i, random.Random(seed + i), spread_km))
+                for i in range(users)
+            ))
+        finally:
+            wall = time.perf_counter() - started
+            monitor.cancel()
+
+    await redis_conn.aclose()
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    updates = sum(len(v) for v in latencies.values())
+    commands = Counter(counting.commands)
+    round_trips = commands.pop("_round_trips", 0)
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "think_s": think,
+        "send_latency_s": send_latency,
+        "updates": updates,
+        "wall_s": round(wall, 2),
+        "updates_per_s": round(updates / wall, 1) if wall else None,
+        "steps": {
+            step: {
+                "p50_ms": ms(_percentile(latencies[step], 0.5)),
+                "p95_ms": ms(_percentile(latencies[step], 0.95)),
+                "p99_ms": ms(_percentile(latencies[step], 0.99)),
+                "max_ms": ms(max(latencies[step]) if latencies[step] else None),
+            }
+            for step in STEPS
+        },
+        "loop_lag_ms": {
+            "p50": ms(_percentile(lag, 0.5)),
+            "p99": ms(_percentile(lag, 0.99)),
+            "max": ms(max(lag) if lag else None),
+        },
+        "redis": {
+            "commands_per_update": round(sum(commands.values()) / updates, 2) if updates else None,
+            "round_trips_per_update": round(round_trips / updates, 2) if updates else None,
+            "top_commands": dict(commands.most_common(10)),
+        },
+        "bot_api_per_update": round(sum(session.calls.values()) / updates, 2) if updates else None,
+        "bot_api_calls": dict(session.calls),
+        "provider_calls": dict(transport.calls),
+        "errors": dict(errors),
+    }
+
+
+def _print(result: Dict[str, Any]) -> None:
+    print(f"{result['updates']} updates in {result['wall_s']}s → {result['updates_per_s']} updates/s")
+    print(f"{'step':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, s in result["steps"].items():
+        print(f"{step:<10}" + "".join(
+            f"{s[k] if s[k] is not None else '-':>10}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")
+        ))
+    lag = result["loop_lag_ms"]
+    print(f"event loop lag: p50 {lag['p50']} ms, p99 {lag['p99']} ms, max {lag['max']} ms")
+    redis_stats = result["redis"]
+    print(
+        f"redis: {redis_stats['commands_per_update']} commands / "
+        f"{redis_stats['round_trips_per_update']} round trips per update; "
+        f"top: {redis_stats['top_commands']}"
+    )
+    print(f"bot api: {result['bot_api_per_update']} calls per update {result['bot_api_calls']}")
+    if result["errors"]:
+        print(f"errors: {result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000, help="синтетических пользователей")
+    parser.add_argument("--concurrency", type=int, default=200, help="диалогов одновременно")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза до шага: случайно 0..think, секунды")
+    parser.add_argument("--send-latency", type=float, default=0.03, help="ответ Bot API, секунды")
+    parser.add_argument("--spread-km", type=float, default=3.0, help="радиус разброса геопозиций")
+    parser.add_argument("--telegram-limits", action="store_true", help="не снимать TG_* flood-лимиты")
+    parser.add_argument("--redis-url", help="настоящий Redis вместо fakeredis (база очищается)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    parser.add_argument("--verbose", action="store_true", help="логи бота (по умолчанию скрыты)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    for key, value in _BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    from bot.config import settings
+    settings.METRICS_PORT = 0
+    if not args.telegram_limits:
+        settings.TG_GLOBAL_RATE = 1_000_000.0
+        settings.TG_CHAT_INTERVAL = 0.0
+        settings.TG_GROUP_INTERVAL = 0.0
+
+    result = asyncio.run(run(
+        args.users, args.concurrency, args.think, args.send_latency, args.spread_km,
+        args.redis_url, args.seed,
+    ))
+    _print(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": _git_commit(),
+                "redis": "url" if args.redis_url else "fakeredis",
+                "telegram_limits": args.telegram_limits,
+                **result,
+            }, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/codec_bench.py
+# -*- coding: utf-8 -*-
+"""
+Сравнение кодеков значений кэша поиска: байты в Redis и время декода на хит.
+
+Запуск из корня проекта:
+    python -m benchmarks.codec_bench [--places 60] [--rounds 2000] [--json out.json]
+
+Запись — как у тайлового кэша places_service: {"ts", "places": [Place.to_dict()]}.
+Декод включает сборку Place.from_dict — ровно то, что делает каждый хит Redis.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from bot.utils import codec
+from bot.utils.place import Place
+
+
+def _sample_places(n: int, seed: int = 42):
+    rnd = random.Random(seed)
+    places = []
+    for i in range(n):
+        rated = i % 2 == 0
+        places.append(Place(
+            place_id=f"{'4b' if rated else 'poi.'}{rnd.getrandbits(48):012x}",
+            name=f"Place {i} {rnd.choice(['Cafe', 'Bistro', 'Bar', 'Phở', 'Bún chả'])}",
+            lat=10.7769 + rnd.uniform(-0.01, 0.01),
+            lon=106.7009 + rnd.uniform(-0.01, 0.01),
+            rating=round(rnd.uniform(3.0, 5.0), 2) if rated else None,
+            user_ratings_total=rnd.randint(0, 900) if rated else 0,
+            types=("Café", "Coffee Shop") if rated else ("poi",),
+            primary_type="Café" if rated else "poi",
+            vicinity=f"{rnd.randint(1, 300)} Nguyễn Huệ, Bến Nghé, Quận 1, Hồ Chí Minh",
+            price_level=rnd.randint(1, 4) if rated else None,
+            open_now=rnd.choice([True, False, None]) if rated else None,
+        ))
+    return places
+
+
+def _decode_hit(payload):
+    data = codec.unpack(payload)
+    return [Place.from_dict(p) for p in data["places"]]
+
+
+def run(n_places: int, rounds: int):
+    entry = {"ts": time.time(), "places": [p.to_dict() for p in _sample_places(n_places)]}
+    results = []
+
+    # Базовая линия — как было: json.dumps / json.loads без заголовка
+    legacy = json.dumps(entry).encode()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        [Place.from_dict(p) for p in json.loads(legacy)["places"]]
+    results.append({
+        "codec": "stdlib json (legacy)",
+        "bytes": len(legacy),
+        "decode_us": (time.perf_counter() - started) / rounds * 1e6,
+    })
+
+    for name, codec_id, compress in codec.available_codecs():
+        payload = codec.pack(entry, codec=codec_id, compress=compress)
+        assert _decode_hit(payload) == _decode_hit(legacy)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            _decode_hit(payload)
+        results.append({
+            "codec": name + (" (orjson)" if name.startswith("json") and codec.orjson else ""),
+            "bytes": len(payload),
+            "decode_us": (time.perf_counter() - started) / rounds * 1e6,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--places", type=int, default=60, help="мест в записи тайла")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args()
+
+    results = run(args.places, args.rounds)
+
+    print(f"{'codec':<28}{'bytes':>10}{'decode µs/hit':>16}")
+    for r in results:
+        print(f"{r['codec']:<28}{r['bytes']:>10}{r['decode_us']:>16.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"places": args.places, "rounds": args.rounds, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
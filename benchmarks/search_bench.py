@@ -0,0 +1,385 @@
+# benchmarks/search_bench.py
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный прогон places_service.search_places без внешних сервисов.
+
+Запуск из корня проекта:
+    python -m benchmarks.search_bench [--searches 200] [--concurrency 20]
+        [--scenario cold warm_redis ...] [--redis-url redis://localhost:6379/15]
+        [--json out.json] [--compare baseline.json]
+
+- Foursquare / Mapbox / VietMap подменены httpx.MockTransport в ProviderHttp:
+  у каждого заглушки задержка (+ разброс), доля 5xx и размер ответа
+  (мест в ответе и лишних байт на место) — см. SCENARIOS;
+- Redis — fakeredis в памяти (pip install fakeredis) или настоящий
+  сервер по --redis-url (база очищается перед каждым сценарием!);
+- ProviderHealth подключён, как в боте; квоты провайдеров — нет.
+fakeredis сам ест CPU процесса: для абсолютных цифр — --redis-url,
+для сравнения коммитов между собой хватает и fakeredis.
+
+Сценарии:
+    cold        пустой кэш и каталог, каждый поиск — в новом тайле
+    warm_redis  те же точки после cold, L1 процесса сброшен — хиты из Redis
+    warm_l1     те же точки ещё раз — хиты из L1
+    sparse      основные провайдеры почти пусты — поиск уходит в fallback
+    degraded    Foursquare медленный и отвечает 5xx в 30% запросов
+
+Результат — поисков в секунду и p50/p95/p99 задержки; --json сохраняет
+его вместе с коммитом, --compare печатает разницу с сохранённым прогоном.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import subprocess
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bot.utils import places_service
+from bot.utils.http_client import ProviderHttp
+from bot.utils.provider_health import ProviderHealth
+
+try:
+    import fakeredis.aioredis as fakeredis
+except ImportError:  # нужен только без --redis-url
+    fakeredis = None
+
+CENTER = (10.7769, 106.7009)   # Хошимин, Quận 1
+TILE_STEP = 0.05               # ~5.5 км между точками cold-сценария: тайлы не пересекаются
+RADIUS = 1000
+
+
+@dataclass
+class StubProvider:
+    """Поведение заглушки провайдера."""
+
+    latency: float = 0.15      # средняя задержка ответа, секунды
+    jitter: float = 0.5        # разброс: ± доля от latency
+    error_rate: float = 0.0    # доля ответов 503
+    places: int = 30           # мест в ответе
+    pad: int = 0               # лишних байт описания на место
+
+
+NORMAL = {
+    "mapbox": StubProvider(latency=0.12, places=30),
+    "foursquare": StubProvider(latency=0.25, places=15),
+    "vietmap": StubProvider(latency=0.2, places=20),
+}
+
+SCENARIOS: Dict[str, Dict[str, StubProvider]] = {
+    "cold": NORMAL,
+    "warm_redis": NORMAL,
+    "warm_l1": NORMAL,
+    "sparse": {
+        "mapbox": StubProvider(latency=0.12, places=1),
+        "foursquare": StubProvider(latency=0.25, places=0),
+        "vietmap": StubProvider(latency=0.3, places=12),
+    },
+    "degraded": {
+        "mapbox": StubProvider(latency=0.12, places=30),
+        "foursquare": StubProvider(latency=1.8, jitter=0.8, error_rate=0.3, places=15),
+        "vietmap": StubProvider(latency=0.2, places=20),
+    },
+}
+
+# warm_* продолжают cold на том же Redis
+CHAINED = {"warm_redis": "cold", "warm_l1": "warm_redis"}
+
+_HOSTS = {
+    "api.mapbox.com": "mapbox",
+    "api.foursquare.com": "foursquare",
+    "maps.vietmap.vn": "vietmap",
+}
+
+
+# --- Заглушки провайдеров ---
+
+def _point(request: httpx.Request, provider: str) -> Tuple[float, float]:
+    params = request.url.params
+    if provider == "mapbox":
+        lon, lat = params["proximity"].split(",")
+    elif provider == "foursquare":
+        lat, lon = params["ll"].split(",")
+    else:
+        lat, lon = params["lat"], params["lng"]
+    return float(lat), float(lon)
+
+
+def _scatter(rnd: random.Random, lat: float, lon: float, radius: float) -> Tuple[float, float]:
+    """Случайная точка в круге radius метров."""
+    r = radius * math.sqrt(rnd.random())
+    a = rnd.uniform(0, 2 * math.pi)
+    return (
+        lat + r * math.cos(a) / 111_320,
+        lon + r * math.sin(a) / (111_320 * math.cos(math.radians(lat))),
+    )
+
+
+def _area(request: httpx.Request, provider: str) -> Tuple[float, float, float]:
+    """Центр и радиус области запроса (у Mapbox — вписанный в bbox круг)."""
+    params = request.url.params
+    if provider == "mapbox" and "bbox" in params:
+        lon_min, lat_min, lon_max, lat_max = map(float, params["bbox"].split(","))
+        lat, lon = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+        return lat, lon, (lat_max - lat_min) / 2 * 111_320
+    lat, lon = _point(request, provider)
+    return lat, lon, float(params.get("radius", RADIUS))
+
+
+def _payload(provider: str, stub: StubProvider, request: httpx.Request, rnd: random.Random) -> Dict[str, Any]:
+    lat, lon, radius = _area(request, provider)
+    count = min(stub.places, int(request.url.params.get("limit", stub.places)))
+    padding = "x" * stub.pad
+    items = []
+    for i in range(count):
+        p_lat, p_lon = _scatter(rnd, lat, lon, radius)
+        name = f"{rnd.choice(['Cafe', 'Bistro', 'Bar', 'Phở', 'Bún chả'])} {i}"
+        address = f"{rnd.randint(1, 300)} Nguyễn Huệ, Quận 1, Hồ Chí Minh {padding}"
+        if provider == "mapbox":
+            items.append({
+                "id": f"poi.{rnd.getrandbits(48):012x}",
+                "text": name,
+                "place_type": ["poi"],
+                "place_name": address,
+                "geometry": {"coordinates": [p_lon, p_lat]},
+            })
+        elif provider == "foursquare":
+            items.append({
+                "fsq_id": f"4b{rnd.getrandbits(48):012x}",
+                "name": name,
+                "rating": round(rnd.uniform(6.0, 10.0), 1),
+                "stats": {"total_ratings": rnd.randint(0, 900)},
+                "location": {"formatted_address": address},
+                "categories": [{"name": "Café"}],
+                "geocodes": {"main": {"latitude": p_lat, "longitude": p_lon}},
+                "price": rnd.randint(1, 4),
+                "hours": {"open_now": rnd.choice([True, False])},
+            })
+        else:
+            items.append({
+                "id": f"vm{rnd.getrandbits(48):012x}",
+                "name": name,
+                "lat": p_lat,
+                "lng": p_lon,
+                "address": address,
+            })
+
+    key = {"mapbox": "features", "foursquare": "results"}.get(provider, "data")
+    return {key: items}
+
+
+class StubTransport(httpx.MockTransport):
+    """MockTransport, отвечающий за всех провайдеров по профилям сценария."""
+
+    def __init__(self, profiles: Dict[str, StubProvider], seed: int = 42):
+        self.profiles = profiles
+        self.rnd = random.Random(seed)
+        self.calls: Counter = Counter()
+        super().__init__(self._handle)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        provider = _HOSTS[request.url.host]
+        stub = self.profiles[provider]
+        self.calls[provider] += 1
+
+        delay = stub.latency * (1 + self.rnd.uniform(-stub.jitter, stub.jitter))
+        await asyncio.sleep(max(delay, 0.0))
+
+        if self.rnd.random() < stub.error_rate:
+            self.calls[f"{provider}_errors"] += 1
+            return httpx.Response(503, text="stub: unavailable")
+        return httpx.Response(200, json=_payload(provider, stub, request, self.rnd))
+
+
+# --- Прогон ---
+
+def _locations(n: int) -> List[Tuple[float, float]]:
+    """n точек сеткой вокруг CENTER — каждая в своём тайле кэша."""
+    side = math.ceil(math.sqrt(n))
+    return [
+        (CENTER[0] + (i // side) * TILE_STEP, CENTER[1] + (i % side) * TILE_STEP)
+        for i in range(n)
+    ]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+async def _connect(redis_url: Optional[str], flush: bool):
+    if redis_url:
+        import redis.asyncio as redis
+        conn = redis.Redis.from_url(redis_url, decode_responses=True)
+        if flush:
+            await conn.flushdb()
+        return conn
+    if fakeredis is None:
+        raise SystemExit("fakeredis is not installed: pip install fakeredis, or pass --redis-url")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+async def run_scenario(
+    name: str,
+    redis_conn,
+    searches: int,
+    concurrency: int,
+    seed: int,
+) -> Dict[str, Any]:
+    transport = StubTransport(SCENARIOS[name], seed=seed)
+    http = ProviderHttp(transport=transport, health=ProviderHealth(redis_conn))
+    # L1 процесса — только внутри сценария (warm_l1 наследует его от warm_redis)
+    if name != "warm_l1":
+        places_service._l1.clear()
+    stats_before = Counter(places_service.CACHE_STATS)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    results: List[int] = []
+    errors = 0
+
+    async def one(lat: float, lon: float) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                places = await places_service.search_places(
+                    None, lat, lon, RADIUS, 0.0, 5.0, "en",
+                    "fsq-key", "mapbox-token", "vietmap-key", redis_conn, http=http,
+                )
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+            results.append(len(places))
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(lat, lon) for lat, lon in _locations(searches)))
+    finally:
+        await http.aclose()
+    wall = time.perf_counter() - started
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    cache = Counter(places_service.CACHE_STATS)
+    cache.subtract(stats_before)
+    return {
+        "scenario": name,
+        "searches": searches,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": ms(_percentile(latencies, 0.5)),
+        "p95_ms": ms(_percentile(latencies, 0.95)),
+        "p99_ms": ms(_percentile(latencies, 0.99)),
+        "max_ms": ms(max(latencies) if latencies else None),
+        "errors": errors,
+        "avg_results": round(sum(results) / len(results), 2) if results else 0,
+        "provider_calls": dict(transport.calls),
+        "cache": {k: v for k, v in cache.items() if v},
+        "profiles": {p: asdict(s) for p, s in SCENARIOS[name].items()},
+    }
+
+
+async def run(
+    scenarios: List[str],
+    searches: int,
+    concurrency: int,
+    redis_url: Optional[str] = None,
+    seed: int = 42,
+) -> List[Dict[str, Any]]:
+    results = []
+    conns = {}
+    for name in scenarios:
+        parent = CHAINED.get(name)
+        if parent in conns:
+            redis_conn = conns[parent]
+        else:
+            redis_conn = await _connect(redis_url, flush=True)
+        # Держим все соединения до конца: codec.binary_client кэширует по id()
+        conns[name] = redis_conn
+        results.append(await run_scenario(name, redis_conn, searches, concurrency, seed))
+    for redis_conn in {id(c): c for c in conns.values()}.values():
+        await redis_conn.aclose()
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    columns = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'scenario':<12}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for r in results:
+        rps, p50, p95, p99 = (r[c] if r[c] is not None else "-" for c in columns)
+        print(f"{r['scenario']:<12}{rps:>9}{p50:>10}{p95:>10}{p99:>10}{r['errors']:>8}")
+
+        base = (baseline or {}).get(r["scenario"])
+        if base:
+            deltas = []
+            for c in columns:
+                if r[c] and base.get(c):
+                    deltas.append(f"{c} {(r[c] - base[c]) / base[c] * 100:+.1f}%")
+            print(f"{'':<12}vs baseline: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--searches", type=int, default=200, help="поисков на сценарий")
+    parser.add_argument("--concurrency", type=int, default=20, help="поисков одновременно")
+    parser.add_argument("--redis-url", help="настоящий Redis вместо fakeredis (база очищается)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--verbose", action="store_true", help="логи бота (по умолчанию скрыты)")
+    args = parser.parse_args()
+
+    # Ошибки заглушек провайдеров логируются на каждый поиск — не мешаем таблице
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    scenarios = list(args.scenario)
+    # warm_* без своего cold меряли бы холодный кэш
+    for name in list(scenarios):
+        anchor, parent = name, CHAINED.get(name)
+        while parent and parent not in scenarios:
+            scenarios.insert(scenarios.index(anchor), parent)
+            anchor, parent = parent, CHAINED.get(parent)
+
+    results = asyncio.run(run(scenarios, args.searches, args.concurrency, args.redis_url, args.seed))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    _print(results, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": _git_commit(),
+                "searches": args.searches,
+                "concurrency": args.concurrency,
+                "redis": "url" if args.redis_url else "fakeredis",
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
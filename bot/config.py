@@ -19,6 +19,46 @@ class Settings(BaseSettings):
     VIETMAP_API_KEY: str # VietMap
     ADMIN_ID: int          # Telegram user_id для получения фидбэка
 
+    # HTTP-пул к провайдерам мест (bot/utils/http_client.py)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20       # keep-alive соединений на хост провайдера
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2_ENABLED: bool = False        # требует пакет h2 (httpx[http2])
+
+    # Дневная квота запросов к Foursquare (bot/utils/rate_limiter.py)
+    FSQ_DAILY_QUOTA: int = 1000
+
+    # Исходящие запросы к Telegram (bot/middlewares/outbound.py)
+    TG_GLOBAL_RATE: float = 30.0       # сообщений/с на процесс бота
+    TG_CHAT_INTERVAL: float = 1.0      # секунд между сообщениями в личный чат
+    TG_GROUP_INTERVAL: float = 3.0     # то же для групп и каналов
+    TG_CHAT_BURST: int = 3             # запросов в чат подряд без ожидания
+
+    # Режим: "polling", "webhook" (bot/webhook.py),
+    # "ingress" / "worker" — апдейты через Redis Streams (bot/updates_stream.py)
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: str = ""              # публичный https-адрес, например https://bot.example.com
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""           # X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_MAX_CONNECTIONS: int = 40  # параллельных запросов от Telegram
+    WEBHOOK_WORKERS: int = 1           # процессов на одном порту (SO_REUSEPORT)
+    WEBHOOK_MAX_INFLIGHT: int = 100    # больше апдейтов в обработке — health отвечает 503
+    WEBAPP_HOST: str = "0.0.0.0"
+    WEBAPP_PORT: int = 8080
+    UPDATE_SHARDS: int = 16            # шард-стримов апдейтов; не меняется без остановки воркеров
+    SHARD_CONCURRENCY: int = 32        # апдейтов разных пользователей в обработке на шард
+
+    # Клиентский кэш user_lang:* с RESP3 CLIENT TRACKING (bot/utils/client_cache.py), Redis 6+
+    CLIENT_CACHE_ENABLED: bool = False
+
+    # Метрики Prometheus (bot/utils/metrics.py): GET /metrics; 0 — выключено.
+    # Webhook-воркеры занимают METRICS_PORT + номер воркера
+    METRICS_PORT: int = 9100
+    TRACE_SPANS: bool = False          # этапы поиска с correlation id в лог
+
+    # Инвалидация L1-кэша поиска между репликами через Redis pub/sub
+    L1_INVALIDATION_ENABLED: bool = True
+
 
 # Единый экземпляр настроек для всего приложения.
 settings = Settings()
@@ -12,11 +12,15 @@
   чтобы устранить TypeError и несоответствие позиций аргументов.
 """
 
+import asyncio
+import html
 import logging
-from typing import Tuple, Optional
+import time
+from typing import List, Tuple, Optional
 
 import redis.asyncio as redis
 from aiogram import Router, F, types, Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -24,12 +28,16 @@ from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKey
 
 from bot.utils.geospatial import calculate_distance, calculate_bearing, bearing_to_direction
 from bot.keyboards import inline_keyboards
-from bot.utils.places_service import search_places
+from bot.utils import metrics
+from bot.utils.places_service import search_places_stream
+from bot.utils.place import Place
 from bot.config import settings
 from bot.services.translator import get_string
 
 router = Router()
 
+RESULT_BUTTON_TITLE = 32  # максимум символов названия места на кнопке
+
 
 # --- Состояния FSM ---
 
@@ -59,35 +67,183 @@ def _format_place_card(
     lang_code: str,
     user_lat: float,
     user_lon: float,
-    place: dict,
+    place: Place,
+    index: Optional[int] = None,
 ) -> str:
     """
     Формирует текст карточки места с расстоянием и направлением.
+    Расстояние/азимут берутся из place.distance/place.bearing,
+    если их уже посчитал places_service.
     """
-    name = place.get("name", "—")
-    rating = place.get("rating", "—")
-    ratings_total = place.get("user_ratings_total", 0)
-    vicinity = place.get("vicinity") or "—"
-    plat = place.get("lat")
-    plon = place.get("lon")
+    name = html.escape(place.name or "—")
+    rating = place.rating if place.rating is not None else "—"
+    ratings_total = place.user_ratings_total or 0
+    vicinity = html.escape(place.vicinity or "—")
+    number = f"{index}. " if index is not None else ""
 
     # Геометрия
     distance_m = "—"
     direction_txt = "—"
-    if plat is not None and plon is not None:
-        dist = calculate_distance(user_lat, user_lon, float(plat), float(plon))
-        brg = calculate_bearing(user_lat, user_lon, float(plat), float(plon))
+    if place.located:
+        dist = place.distance
+        brg = place.bearing
+        if dist is None or brg is None:
+            dist = calculate_distance(user_lat, user_lon, float(place.lat), float(place.lon))
+            brg = calculate_bearing(user_lat, user_lon, float(place.lat), float(place.lon))
         direction_txt = bearing_to_direction(_t(lang_code), brg)
         distance_m = f"{dist} м"
 
     return (
-        f"📍 <b>{name}</b>\n"
+        f"📍 <b>{number}{name}</b>\n"
         f"⭐️ {rating} ({int(ratings_total)})\n"
         f"🧭 {distance_m} • {direction_txt}\n"
         f"🗺 {vicinity}"
     )
 
 
+def _top(candidates: List[Place], n: int = 3) -> List[Place]:
+    """Топ-N по рейтингу и количеству оценок."""
+    return sorted(
+        candidates,
+        key=lambda p: (
+            float(p.rating or 0.0),
+            int(p.user_ratings_total or 0),
+        ),
+        reverse=True,
+    )[:n]
+
+
+def _format_provisional(lang_code: str, top: List[Place]) -> str:
+    """
+    Предварительный топ для сообщения «ищем…», пока отвечают остальные провайдеры.
+    """
+    lines = [get_string("searching", lang=lang_code), ""]
+    for p in top:
+        rating = p.rating if p.rating is not None else "—"
+        distance = f" • {p.distance} м" if p.distance is not None else ""
+        lines.append(f"▫️ <b>{html.escape(p.name or '—')}</b> ⭐️ {rating}{distance}")
+    return "\n".join(lines)
+
+
+def _main_type(lang_code: str, place: Place) -> str:
+    """Тип заведения для текста шаринга (type_restaurant / type_cafe / type_bar / type_food)."""
+    kinds = " ".join((place.primary_type or "", *place.types)).lower()
+    for kind in ("restaurant", "cafe", "bar"):
+        if kind in kinds:
+            return get_string(f"type_{kind}", lang=lang_code)
+    return get_string("type_food", lang=lang_code)
+
+
+def _maps_url(place: Place) -> str:
+    return f"https://www.google.com/maps/search/?api=1&query={place.lat},{place.lon}"
+
+
+def _render_results(
+    lang_code: str,
+    user_lat: float,
+    user_lon: float,
+    top: List[Place],
+) -> Tuple[str, types.InlineKeyboardMarkup]:
+    """
+    Весь топ одним HTML-сообщением: заголовок, пронумерованные карточки
+    и клавиатура (карта + шаринг на каждое место, новый поиск).
+    Раньше это было до 4 исходящих вызовов на поиск, теперь — один.
+    """
+    _ = _t(lang_code)
+    cards = [
+        _format_place_card(lang_code, user_lat, user_lon, p, index=i)
+        for i, p in enumerate(top, start=1)
+    ]
+    text = get_string("found_results", lang=lang_code) + "\n\n" + "\n\n".join(cards)
+
+    buttons = []
+    for i, p in enumerate(top, start=1):
+        if not p.located:
+            continue
+        direction = bearing_to_direction(_, p.bearing) if p.bearing is not None else ""
+        share_text = get_string("share_text_template", lang=lang_code).format(
+            place_name=p.name or "—",
+            main_type=_main_type(lang_code, p),
+            rating=p.rating if p.rating is not None else "—",
+            distance=p.distance if p.distance is not None else "—",
+            direction=direction,
+            google_maps_url=_maps_url(p),
+        )
+        title = f"{i}. {(p.name or '—')[:RESULT_BUTTON_TITLE]}"
+        buttons.append((title, share_text, _maps_url(p)))
+
+    return text, inline_keyboards.get_results_keyboard(_, buttons)
+
+
+async def _edit_status(
+    status_message: Optional[Message],
+    text: str,
+    reply_markup: Optional[types.InlineKeyboardMarkup] = None,
+) -> bool:
+    """
+    Правка сообщения «ищем…»; ошибки правки не должны ломать выдачу.
+    False — править нечего или правка не удалась (нужно отправить новое сообщение).
+    """
+    if status_message is None:
+        return False
+    try:
+        await status_message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        logging.debug("Status message edit skipped: %s", e)
+        return "message is not modified" in str(e)
+    return True
+
+
+class _ProvisionalStatus:
+    """
+    Предварительный топ в «ищем…» — в фоне, чтобы правки не задерживали
+    ни чтение ответов провайдеров, ни итог: одна правка в полёте,
+    из накопившихся показывается последняя (latest wins).
+    """
+
+    def __init__(self, status_message: Optional[Message]):
+        self.status_message = status_message
+        self._text: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def show(self, text: str) -> None:
+        if self.status_message is None:
+            return
+        self._text = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """
+        Итог готов: неотправленный текст отбрасывается. Правку в полёте
+        не отменяем — отменённый запрос мог уже уйти и лечь поверх итога;
+        итоговая правка встанет за ней в OutboundScheduler, а ждущую заменит.
+        """
+        self._text = None
+
+    async def _run(self) -> None:
+        while self._text is not None:
+            text, self._text = self._text, None
+            try:
+                await _edit_status(self.status_message, text)
+            except Exception as e:
+                # Предварительный топ необязателен — итог всё равно придёт
+                logging.debug("Provisional status edit failed: %s", e)
+
+
+async def _deliver(
+    bot: Bot,
+    chat_id: int,
+    status_message: Optional[Message],
+    text: str,
+    reply_markup: Optional[types.InlineKeyboardMarkup] = None,
+) -> None:
+    """Итог поиска одним вызовом: правим «ищем…», а если не вышло — одно новое сообщение."""
+    if not await _edit_status(status_message, text, reply_markup):
+        await bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=reply_markup)
+
+
+@metrics.traced
 async def process_and_send_results(
     chat_id: int,
     bot: Bot,
@@ -98,9 +254,15 @@ async def process_and_send_results(
     lang_code: str,
     redis_conn,  # Кэш
     analytics=None,
+    http_client=None,  # Общий пул HTTP-соединений к провайдерам
+    status_message: Optional[Message] = None,  # Сообщение «ищем…» для предварительного топа
 ) -> None:
     """
     Выполняет поиск мест по параметрам из FSM и отправляет результаты.
+    Пока провайдеры отвечают, сообщение «ищем…» показывает предварительный топ-3
+    и уточняет его с каждым ответом (search_places_stream, правки в фоне —
+    _ProvisionalStatus); итог заменяет его одним сообщением с клавиатурой
+    (_render_results) и предварительных правок не ждёт.
     """
     user_data = await state.get_data()
     lat = float(user_data["latitude"])
@@ -112,7 +274,12 @@ async def process_and_send_results(
         lat, lon, radius, min_rating, max_rating, lang_code
     )
 
-    all_candidates = await search_places(
+    started = time.monotonic()
+    all_candidates: List[Place] = []
+    shown: List[Optional[str]] = []
+    provisional_status = _ProvisionalStatus(status_message)
+
+    async for candidates, final in search_places_stream(
         _,
         lat=lat,
         lon=lon,
@@ -124,36 +291,44 @@ async def process_and_send_results(
         mapbox_token=settings.MAPBOX_TOKEN,
         vietmap_api_key=settings.VIETMAP_API_KEY,  # ВьетМап
         redis_conn=redis_conn,  # Кэш
-     )
+        http=http_client,
+    ):
+        if final:
+            all_candidates = candidates
+            break
+
+        provisional = _top(candidates)
+        ids = [p.place_id for p in provisional]
+        if provisional and ids != shown:
+            shown = ids
+            provisional_status.show(_format_provisional(lang_code, provisional))
+
+    provisional_status.stop()
 
     logging.info("Places fetched: %s before final sorting/capping", len(all_candidates))
+    elapsed = time.monotonic() - started
+    metrics.observe_stage(metrics.STAGE_SEARCH, elapsed)
+    if analytics:
+        await analytics.track_search_latency(elapsed)
 
     # Сортировка по рейтингу и количеству оценок
-    all_candidates.sort(
-        key=lambda p: (
-            float(p.get("rating") or 0.0),
-            int(p.get("user_ratings_total") or 0),
-        ),
-        reverse=True,
-    )
-
-    top = all_candidates[:3]
+    top = _top(all_candidates)
 
     if not top:
         if analytics:
             await analytics.track_empty_result()
-        await bot.send_message(
-            chat_id,
+        await _deliver(
+            bot, chat_id, status_message,
             get_string("no_results", lang=lang_code) + "\n" + get_string("try_another_range", lang=lang_code),
+            inline_keyboards.get_new_search_keyboard(_t(lang_code)),
         )
         return
 
     if analytics:
         await analytics.track_search_request()
 
-    for p in top:
-        text = _format_place_card(lang_code, lat, lon, p)
-        await bot.send_message(chat_id, text, parse_mode="HTML")
+    text, keyboard = _render_results(lang_code, lat, lon, top)
+    await _deliver(bot, chat_id, status_message, text, keyboard)
 
 
 # --- Хендлеры диалога ---
@@ -171,15 +346,26 @@ async def handle_start(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("lang_"))
-async def set_language(callback: CallbackQuery, state: FSMContext, redis_conn, analytics=None, **kwargs):
+async def set_language(
+    callback: CallbackQuery,
+    state: FSMContext,
+    redis_conn,
+    analytics=None,
+    update_context=None,
+    **kwargs,
+):
     """
     Сохраняем выбранный язык в FSM и в Redis (для I18nMiddleware).
     """
     lang_code = callback.data.split("_", 1)[1]
     await state.update_data(lang_code=lang_code)
 
-    # Сохраняем в Redis — I18nMiddleware читает отсюда на каждый апдейт
-    await redis_conn.set(f"user_lang:{callback.from_user.id}", lang_code)
+    # Сохраняем в Redis — I18nMiddleware читает отсюда на каждый апдейт;
+    # в контексте апдейта запись уйдёт одним pipeline вместе с FSM
+    if update_context is not None:
+        update_context.set_lang(lang_code)
+    else:
+        await redis_conn.set(f"user_lang:{callback.from_user.id}", lang_code)
 
     # Клавиатура для отправки геопозиции
     kb = ReplyKeyboardMarkup(
@@ -225,7 +411,14 @@ async def set_radius(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("rating_"), SearchSteps.waiting_for_rating)
-async def get_rating_from_button(callback: CallbackQuery, state: FSMContext, analytics=None, **kwargs):
+async def get_rating_from_button(
+    callback: CallbackQuery,
+    state: FSMContext,
+    redis_conn,
+    analytics=None,
+    http_client=None,
+    **kwargs,
+):
     """
     Обработаем предустановленный диапазон рейтинга и запустим поиск.
     """
@@ -241,14 +434,36 @@ async def get_rating_from_button(callback: CallbackQuery, state: FSMContext, ana
         await analytics.track_user(callback.from_user.id)
         await analytics.track_feature_use("rating", f"{min_s}_{max_s}")
 
-    await callback.message.answer(get_string("searching", lang=lang_code))
+    status_message = await callback.message.answer(get_string("searching", lang=lang_code))
 
     await process_and_send_results(
         callback.message.chat.id, callback.bot, state,
         min_rating, max_rating, _t(lang_code), lang_code,
+        redis_conn=redis_conn,
         analytics=analytics,
+        http_client=http_client,
+        status_message=status_message,
     )
     await callback.answer()
 
 
+@router.callback_query(F.data == "new_search")
+async def new_search(callback: CallbackQuery, state: FSMContext):
+    """
+    Кнопка «Новый поиск» под результатами: язык уже известен — сразу просим геопозицию.
+    """
+    data = await state.get_data()
+    lang_code = data.get("lang_code", "ru")
+
+    kb = ReplyKeyboardMarkup(
+        resize_keyboard=True,
+        keyboard=[[KeyboardButton(text=get_string("send_location_btn", lang=lang_code), request_location=True)]],
+        one_time_keyboard=True,
+    )
+
+    await callback.message.answer(get_string("request_location", lang=lang_code), reply_markup=kb)
+    await state.set_state(SearchSteps.waiting_for_location)
+    await callback.answer()
+
+
 # Ниже могут быть обработчики ручного ввода радиуса и рейтинга, команда /feedback и т.д.
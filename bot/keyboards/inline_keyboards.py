@@ -5,6 +5,7 @@
 Расширены предустановки радиуса до 200/500/1000 м для практичного охвата.
 """
 
+from typing import List, Tuple
 from urllib.parse import quote_plus
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -58,12 +59,32 @@ def get_new_search_keyboard(_) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def _share_link(share_text: str, url: str) -> str:
+    return f"https://t.me/share/url?text={quote_plus(share_text)}&url={quote_plus(url)}"
+
+
 def get_share_keyboard(_, share_text: str, url: str) -> InlineKeyboardMarkup:
     """
     Клавиатура для шаринга найденного места в Телеграм.
     """
-    tg_share_link = f"https://t.me/share/url?text={quote_plus(share_text)}&url={quote_plus(url)}"
     buttons = [
-        [InlineKeyboardButton(text=_( "share_find_btn"), url=tg_share_link)],
+        [InlineKeyboardButton(text=_( "share_find_btn"), url=_share_link(share_text, url))],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_results_keyboard(_, places: List[Tuple[str, str, str]]) -> InlineKeyboardMarkup:
+    """
+    Клавиатура под сообщением с результатами: по строке на место
+    (places — тройки (подпись, текст для шаринга, url карты) по порядку карточек):
+    название открывает карту, 🚀 — шаринг; внизу — новый поиск.
+    """
+    buttons = [
+        [
+            InlineKeyboardButton(text=title, url=url),
+            InlineKeyboardButton(text="🚀", url=_share_link(share_text, url)),
+        ]
+        for title, share_text, url in places
     ]
+    buttons += get_new_search_keyboard(_).inline_keyboard
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -1,49 +1,159 @@
 import asyncio
 import logging
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
 import redis.asyncio as redis
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import DisabledEventIsolation
 from aiogram.fsm.storage.redis import RedisStorage
 
+from bot import updates_stream, webhook
 from bot.config import settings
 from bot.handlers import user_handlers
+from bot.middlewares.context import UpdateContextMiddleware
 from bot.middlewares.i18n import I18nMiddleware
+from bot.middlewares.http import HttpMiddleware
+from bot.middlewares.outbound import OutboundScheduler
+from bot.utils import codec, metrics, places_service
 from bot.utils.analytics import Analytics
+from bot.utils.client_cache import TrackedCache
+from bot.utils.http_client import ProviderHttp
+from bot.utils.provider_health import ProviderHealth
+from bot.utils.rate_limiter import DEFAULT_LIMITS, ProviderQuota
+from bot.utils.update_context import UpdateScopedStorage
 from bot.middlewares.redis import RedisMiddleware
 
-dp.update.middleware(RedisMiddleware(redis_conn))
 
+@asynccontextmanager
+async def bot_context(
+    worker: int = 0,
+    redis_conn: Optional[redis.Redis] = None,
+    session: Optional[BaseSession] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> AsyncIterator[Tuple[Bot, Dispatcher]]:
+    """
+    Bot и Dispatcher со всеми зависимостями — общая часть polling и webhook.
+    worker — номер процесса webhook-сервера (смещение порта метрик).
+    redis_conn, session (Bot API) и transport (HTTP к провайдерам) подменяет
+    нагрузочный тест benchmarks/bot_load.py.
+    На выходе останавливает фоновые задачи и закрывает пулы соединений.
+    """
+    if redis_conn is None:
+        redis_conn = redis.Redis(host='redis', port=6379, decode_responses=True)
 
-async def main():
-    """Основная функция для настройки и запуска бота."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
-    )
+    # Клиентский кэш user_lang:* с инвалидацией от Redis (CLIENT TRACKING)
+    lang_cache = TrackedCache(redis_conn) if settings.CLIENT_CACHE_ENABLED else None
 
-    redis_conn = redis.Redis(host='redis', port=6379, decode_responses=True)
+    # RedisStorage: FSM-состояния переживают рестарт контейнера;
+    # UpdateScopedStorage — чтение/запись FSM и языка одним pipeline на апдейт
+    storage = UpdateScopedStorage(RedisStorage(redis=redis_conn), lang_cache=lang_cache)
 
-    # RedisStorage: FSM-состояния переживают рестарт контейнера
-    storage = RedisStorage(redis=redis_conn)
+    # Token bucket'ы и дневные квоты провайдеров — общие для реплик через Redis
+    quota = ProviderQuota(redis_conn, limits={
+        "foursquare": replace(DEFAULT_LIMITS["foursquare"], daily=settings.FSQ_DAILY_QUOTA),
+    })
 
-    analytics = Analytics(redis_conn=redis_conn)
+    # Исходящие сообщения: глобальный лимит, бакет и очередь на чат, повтор после 429
+    outbound = OutboundScheduler(
+        global_rate=settings.TG_GLOBAL_RATE,
+        global_burst=int(settings.TG_GLOBAL_RATE),
+        chat_interval=settings.TG_CHAT_INTERVAL,
+        group_interval=settings.TG_GROUP_INTERVAL,
+        chat_burst=settings.TG_CHAT_BURST,
+    )
 
-    bot = Bot(token=settings.BOT_TOKEN)
-    dp = Dispatcher(storage=storage)
+    analytics = Analytics(redis_conn=redis_conn, quota=quota, outbound=outbound, client_cache=lang_cache)
+
+    # Общий пул HTTP-соединений к провайдерам мест — живёт вместе с ботом;
+    # ProviderHealth — circuit breaker'ы провайдеров, общие для реплик через Redis
+    http_client = ProviderHttp(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        http2=settings.HTTP2_ENABLED,
+        transport=transport,
+        health=ProviderHealth(redis_conn),
+        quota=quota,
+    )
+
+    bot = Bot(token=settings.BOT_TOKEN, session=session)
+    bot.session.middleware(outbound)
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    dp.fsm = UpdateContextMiddleware(storage=storage, events_isolation=DisabledEventIsolation())
+    dp.update.outer_middleware(dp.fsm)
 
     # Передаём analytics через workflow_data — доступен в хендлерах через **kwargs
     dp["analytics"] = analytics
 
+    dp.update.middleware(RedisMiddleware(redis_conn))
+    dp.update.middleware(HttpMiddleware(http_client))
     dp.update.middleware(I18nMiddleware(redis_conn))
     dp.include_router(user_handlers.router)
 
-    await bot.delete_webhook(drop_pending_updates=True)
+    # L1-кэш поиска: сбрасываем тайлы, обновлённые другими репликами
+    l1_listener = None
+    if settings.L1_INVALIDATION_ENABLED:
+        l1_listener = asyncio.create_task(places_service.listen_l1_invalidations(redis_conn))
+
+    lang_cache_listener = None
+    if lang_cache is not None:
+        lang_cache_listener = asyncio.create_task(lang_cache.listen())
+
+    # Метрики пишутся в Redis пачками в фоне
+    analytics.start()
+
+    # Поэтапные задержки и счётчики — Prometheus на METRICS_PORT
+    metrics.trace_spans = settings.TRACE_SPANS
+    metrics_server = None
+    if settings.METRICS_PORT:
+        metrics_server = await metrics.start_server(settings.WEBAPP_HOST, settings.METRICS_PORT + worker)
+
+    try:
+        yield bot, dp
+    finally:
+        if l1_listener is not None:
+            l1_listener.cancel()
+        if lang_cache_listener is not None:
+            lang_cache_listener.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await analytics.aclose()
+        await http_client.aclose()
+        await codec.close_binary_client(redis_conn)
+        await bot.session.close()
+
+
+async def run_polling():
+    """Long polling — один процесс-потребитель обновлений."""
+    async with bot_context() as (bot, dp):
+        await bot.delete_webhook(drop_pending_updates=True)
+        logging.info("Запуск бота (polling)...")
+        await dp.start_polling(bot)
+
+
+def main():
+    """Основная функция: режим запуска выбирается BOT_MODE."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+    )
 
-    logging.info("Запуск бота...")
-    await dp.start_polling(bot)
+    if settings.BOT_MODE == "webhook":
+        webhook.run()
+    elif settings.BOT_MODE == "ingress":
+        asyncio.run(updates_stream.run_ingress())
+    elif settings.BOT_MODE == "worker":
+        asyncio.run(updates_stream.run_worker())
+    else:
+        asyncio.run(run_polling())
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except (KeyboardInterrupt, SystemExit):
         logging.info("Бот остановлен.")
@@ -0,0 +1,39 @@
+# bot/middlewares/context.py
+
+from typing import Callable, Dict, Any, Awaitable, cast
+from aiogram import Bot
+from aiogram.fsm.middleware import FSMContextMiddleware
+
+from bot.utils.update_context import UpdateScopedStorage
+
+
+class UpdateContextMiddleware(FSMContextMiddleware):
+    """
+    FSM-middleware диспетчера с контекстом апдейта (bot/utils/update_context.py):
+    язык, состояние и данные читаются одним pipeline до хендлеров,
+    изменения пишутся одним pipeline после. Ставится вместо dp.fsm.
+    """
+
+    storage: UpdateScopedStorage
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        context = self.resolve_event_context(cast(Bot, data["bot"]), data)
+        user = data.get("event_from_user")
+        if context is None and user is None:
+            return await super().__call__(handler, event, data)
+
+        ctx = await self.storage.load(context.key if context else None, user.id if user else None)
+        data["update_context"] = ctx
+
+        token = self.storage.activate(ctx)
+        try:
+            return await super().__call__(handler, event, data)
+        finally:
+            self.storage.deactivate(token)
+            await self.storage.flush(ctx)
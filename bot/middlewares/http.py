@@ -0,0 +1,26 @@
+# bot/middlewares/http.py
+
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+
+from bot.utils.http_client import ProviderHttp
+
+
+class HttpMiddleware(BaseMiddleware):
+    """
+    Прокидывает общий пул HTTP-соединений к провайдерам (http_client) в data.
+    """
+
+    def __init__(self, http_client: ProviderHttp):
+        self.http_client = http_client
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        data["http_client"] = self.http_client
+
+        return await handler(event, data)
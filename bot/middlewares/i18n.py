@@ -19,8 +19,12 @@ class I18nMiddleware(BaseMiddleware):
     ) -> Any:
         user = data.get("event_from_user")
         
+        # Язык уже прочитан вместе с FSM (UpdateContextMiddleware) — без отдельного GET
+        ctx = data.get("update_context")
         if user is None:
             lang_code = DEFAULT_LANG
+        elif ctx is not None:
+            lang_code = ctx.lang or DEFAULT_LANG
         else:
             lang_code = await self.redis.get(f"user_lang:{user.id}")
             if not lang_code:
@@ -0,0 +1,29 @@
+# bot/middlewares/inflight.py
+
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+
+
+class InflightMiddleware(BaseMiddleware):
+    """
+    Считает апдейты, которые сейчас обрабатываются (outer middleware на dp.update).
+    По этому числу health-эндпоинт webhook-а сообщает балансировщику, что реплика занята.
+    """
+
+    def __init__(self):
+        self.inflight = 0
+        self.total = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        self.inflight += 1
+        self.total += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.inflight -= 1
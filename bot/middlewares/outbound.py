@@ -0,0 +1,375 @@
+# bot/middlewares/outbound.py
+# -*- coding: utf-8 -*-
+"""
+Планировщик исходящих запросов к Telegram с учётом flood-лимитов.
+
+Хендлеры просто делают await bot.send_message(...), а под нагрузкой
+Telegram отвечает 429 Too Many Requests. OutboundScheduler — request-middleware
+сессии бота (bot.session.middleware), через него идёт каждый метод с chat_id:
+- глобальный token bucket (TG_GLOBAL_RATE, ≈30 сообщений/с на бота);
+- token bucket на чат: CHAT_BURST запросов сразу, дальше один
+  на TG_CHAT_INTERVAL (личка) / TG_GROUP_INTERVAL (группы и каналы) —
+  «ищу…» и правка с результатом уходят без секундной паузы между ними;
+- новые сообщения в чат уходят по порядку (очередь чата);
+- правки (editMessage*) не встают в очередь чата и не тратят его токены
+  (только глобальный и пауза после 429): у каждого сообщения одна правка
+  в полёте, ждущая правка заменяется более новой (заменённая сразу
+  возвращает True — на экране будет новый текст);
+- 429 → ждём retry_after и повторяем (до MAX_RETRIES), чат на это время на паузе;
+- интерактивные ответы идут раньше массовых рассылок: приоритет берётся
+  из request_priority (rate_limiter) — рассылка выставляет PRIORITY_BACKGROUND;
+- глубина очередей и время ожидания — snapshot() (отчёт Analytics),
+  ожидание и длительность запросов — также в metrics (telegram_queue / telegram_send).
+
+Бакет локальный для процесса: при нескольких репликах TG_GLOBAL_RATE
+задаётся как доля общего лимита бота.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    EditMessageCaption,
+    EditMessageLiveLocation,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+)
+
+from bot.utils import metrics
+from bot.utils.rate_limiter import PRIORITY_BACKGROUND, request_priority
+
+GLOBAL_RATE = 30.0     # сообщений в секунду на бота
+GLOBAL_BURST = 30
+CHAT_INTERVAL = 1.0    # секунд на восстановление токена чата (личка)
+GROUP_INTERVAL = 3.0   # в группе Telegram допускает ~20 сообщений в минуту
+CHAT_BURST = 3         # запросов в чат подряд без ожидания
+MAX_RETRIES = 3        # повторов после 429
+WAIT_WINDOW = 1000     # по скольким последним запросам считать время ожидания
+
+# Меньше — раньше
+_RANK_INTERACTIVE = 0
+_RANK_BULK = 1
+
+_Waiter = Tuple[int, int, asyncio.Future]
+
+# Правки сообщения: ждущую правку можно заменить более новой того же типа
+_EDIT_METHODS = (
+    EditMessageText,
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+    EditMessageMedia,
+    EditMessageLiveLocation,
+)
+_EditKey = Tuple[Union[int, str], int, type]
+_GO = object()
+
+
+def _wake_next(waiters: List[_Waiter]) -> bool:
+    """Будит первого живого ожидающего из кучи; False — будить некого."""
+    while waiters:
+        _rank, _seq, fut = heapq.heappop(waiters)
+        if not fut.done():
+            fut.set_result(None)
+            return True
+    return False
+
+
+class _ChatLane:
+    """
+    Чат: token bucket и очередь новых сообщений
+    (одно в полёте, остальные ждут по приоритету).
+    """
+
+    __slots__ = ("busy", "waiters", "tokens", "refilled", "paused_until", "edits")
+
+    def __init__(self, burst: int):
+        self.busy = False
+        self.waiters: List[_Waiter] = []
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.paused_until = 0.0   # после 429 — до retry_after
+        self.edits = 0            # правок в работе (держат чат от удаления)
+
+    def reserve(self, interval: float, burst: int, take: bool = True) -> float:
+        """
+        Берёт токен (в долг, если их нет); возвращает, сколько ждать.
+        take=False — только пауза после 429 (правки сообщений).
+        """
+        now = time.monotonic()
+        pause = max(self.paused_until - now, 0.0)
+        if interval <= 0 or not take:
+            return pause
+        self.tokens = min(float(burst), self.tokens + (now - self.refilled) / interval)
+        self.refilled = now
+        self.tokens -= 1
+        return max(-self.tokens * interval, pause)
+
+    def refund(self) -> None:
+        self.tokens += 1
+
+    def idle_after(self, interval: float, burst: int) -> float:
+        """Через сколько секунд бакет полон и пауза кончилась."""
+        now = time.monotonic()
+        refill = max(burst - self.tokens, 0.0) * max(interval, 0.0)
+        return max(self.paused_until - now, refill - (now - self.refilled), 0.0)
+
+
+class _EditSlot:
+    """Правки одного сообщения: одна в полёте, одна ждущая (последняя)."""
+
+    __slots__ = ("busy", "pending")
+
+    def __init__(self):
+        self.busy = False
+        self.pending: Optional[asyncio.Future] = None
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Request-middleware сессии бота. Один экземпляр на процесс:
+        bot.session.middleware(OutboundScheduler(...))
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        global_burst: int = GLOBAL_BURST,
+        chat_interval: float = CHAT_INTERVAL,
+        group_interval: float = GROUP_INTERVAL,
+        chat_burst: int = CHAT_BURST,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.chat_burst = max(chat_burst, 1)
+        self.max_retries = max_retries
+
+        self._tokens = float(global_burst)
+        self._refilled = time.monotonic()
+        self._global_waiters: List[_Waiter] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lanes: Dict[Union[int, str], _ChatLane] = {}
+        self._edits: Dict[_EditKey, _EditSlot] = {}
+        self._seq = itertools.count()
+
+        self.stats: Counter = Counter()
+        self._waits: Deque[float] = deque(maxlen=WAIT_WINDOW)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery, правка inline-сообщений — без очереди
+            return await make_request(bot, method)
+
+        bulk = request_priority.get() == PRIORITY_BACKGROUND
+        rank = _RANK_BULK if bulk else _RANK_INTERACTIVE
+        queued_at = time.monotonic()
+
+        if isinstance(method, _EDIT_METHODS) and method.message_id is not None:
+            return await self._edit(make_request, bot, method, chat_id, rank, bulk, queued_at)
+
+        lane = await self._enter_lane(chat_id, rank)
+        try:
+            return await self._send(make_request, bot, method, chat_id, lane, rank, bulk, queued_at)
+        finally:
+            self._leave_lane(chat_id, lane)
+
+    async def _send(
+        self, make_request, bot, method, chat_id, lane: _ChatLane,
+        rank: int, bulk: bool, queued_at: float, chat_token: bool = True,
+    ):
+        """Токен чата (chat_token), глобальный токен, запрос; 429 — пауза чата и повтор."""
+        interval = self._interval(chat_id)
+        for attempt in range(self.max_retries + 1):
+            delay = lane.reserve(interval, self.chat_burst, take=chat_token)
+            try:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self._take_token(rank)
+            except asyncio.CancelledError:
+                if chat_token and interval > 0:
+                    lane.refund()
+                raise
+
+            if attempt == 0:
+                waited = time.monotonic() - queued_at
+                self._waits.append(waited)
+                metrics.observe_stage(metrics.STAGE_TELEGRAM_QUEUE, waited)
+                self.stats["bulk" if bulk else "interactive"] += 1
+
+            try:
+                with metrics.stage(metrics.STAGE_TELEGRAM_SEND):
+                    return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.stats["retry_after"] += 1
+                lane.paused_until = time.monotonic() + e.retry_after
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(
+                    "Telegram flood limit for chat %s: retry in %ss (%s)",
+                    chat_id, e.retry_after, type(method).__name__,
+                )
+
+    def _interval(self, chat_id: Union[int, str]) -> float:
+        # Отрицательные id и @username — группы и каналы
+        if isinstance(chat_id, str) or chat_id < 0:
+            return self.group_interval
+        return self.chat_interval
+
+    # --- Правки сообщений ---
+
+    async def _edit(self, make_request, bot, method, chat_id, rank: int, bulk: bool, queued_at: float):
+        """
+        Правка мимо очереди и бакета чата: ждёт глобальный токен, паузу после 429
+        и свою предыдущую правку. Частоту правок одного сообщения держит
+        слияние: не больше одной правки в полёте. Ждущая правка, которую
+        заменила более новая, возвращает True без запроса.
+        """
+        key = (chat_id, method.message_id, type(method))
+        slot = self._edits.get(key)
+        if slot is None:
+            slot = self._edits[key] = _EditSlot()
+
+        if slot.busy:
+            if slot.pending is not None and not slot.pending.done():
+                slot.pending.set_result(None)
+            fut = slot.pending = asyncio.get_running_loop().create_future()
+            try:
+                turn = await fut
+            except asyncio.CancelledError:
+                if slot.pending is fut:
+                    slot.pending = None
+                elif fut.done() and not fut.cancelled() and fut.result() is _GO:
+                    self._next_edit(key, slot)  # очередь уже передана нам
+                raise
+            if turn is not _GO:
+                self.stats["edits_coalesced"] += 1
+                return True
+        slot.busy = True
+
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _ChatLane(self.chat_burst)
+        lane.edits += 1
+        try:
+            return await self._send(
+                make_request, bot, method, chat_id, lane, rank, bulk, queued_at, chat_token=False,
+            )
+        finally:
+            lane.edits -= 1
+            self._schedule_drop(chat_id, lane)
+            self._next_edit(key, slot)
+
+    def _next_edit(self, key: _EditKey, slot: _EditSlot) -> None:
+        fut, slot.pending = slot.pending, None
+        if fut is not None and not fut.done():
+            fut.set_result(_GO)  # slot.busy остаётся за ней
+            return
+        slot.busy = False
+        if self._edits.get(key) is slot:
+            del self._edits[key]
+
+    # --- Очередь чата ---
+
+    async def _enter_lane(self, chat_id: Union[int, str], rank: int) -> _ChatLane:
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _ChatLane(self.chat_burst)
+
+        if lane.busy:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(lane.waiters, (rank, next(self._seq), fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                # Очередь уже передана нам — отдаём её дальше
+                if fut.done() and not fut.cancelled():
+                    self._leave_lane(chat_id, lane)
+                raise
+        lane.busy = True
+        return lane
+
+    def _leave_lane(self, chat_id: Union[int, str], lane: _ChatLane) -> None:
+        if _wake_next(lane.waiters):
+            return
+        lane.busy = False
+        self._schedule_drop(chat_id, lane)
+
+    def _schedule_drop(self, chat_id: Union[int, str], lane: _ChatLane) -> None:
+        # Пустой чат убираем, когда его бакет наполнится
+        delay = lane.idle_after(self._interval(chat_id), self.chat_burst)
+        asyncio.get_running_loop().call_later(delay, self._drop_idle, chat_id, lane)
+
+    def _drop_idle(self, chat_id: Union[int, str], lane: _ChatLane) -> None:
+        if self._lanes.get(chat_id) is not lane or lane.busy or lane.waiters or lane.edits:
+            return
+        if lane.idle_after(self._interval(chat_id), self.chat_burst) > 0:
+            self._schedule_drop(chat_id, lane)
+            return
+        del self._lanes[chat_id]
+
+    # --- Глобальный token bucket ---
+
+    async def _take_token(self, rank: int) -> None:
+        self._refill()
+        if self._tokens >= 1 and not self._global_waiters:
+            self._tokens -= 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._global_waiters, (rank, next(self._seq), fut))
+        if self._timer is None:
+            self._pump()
+        await fut
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.global_burst, self._tokens + (now - self._refilled) * self.global_rate)
+        self._refilled = now
+
+    def _pump(self) -> None:
+        """
+        Раздаёт накопившиеся токены ожидающим и заводит таймер до следующего.
+        Вызывается, только когда таймер не заведён, либо самим таймером.
+        """
+        self._timer = None
+        self._refill()
+        while self._tokens >= 1 and self._global_waiters:
+            if _wake_next(self._global_waiters):
+                self._tokens -= 1
+
+        if self._global_waiters and self._timer is None:
+            delay = (1 - self._tokens) / self.global_rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+
+    # --- Метрики ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Глубина очередей, время ожидания (мс) и счётчики отправок."""
+        waits = sorted(self._waits)
+
+        def pct(q: float) -> Optional[int]:
+            if not waits:
+                return None
+            return int(waits[min(int(len(waits) * q), len(waits) - 1)] * 1000)
+
+        return {
+            "global_queue": sum(1 for *_x, fut in self._global_waiters if not fut.done()),
+            "chat_queue": sum(len(lane.waiters) + lane.busy for lane in self._lanes.values()),
+            "edit_queue": sum(slot.busy + (slot.pending is not None) for slot in self._edits.values()),
+            "active_chats": len(self._lanes),
+            "wait_p50_ms": pct(0.5),
+            "wait_p95_ms": pct(0.95),
+            "wait_max_ms": int(waits[-1] * 1000) if waits else None,
+            **self.stats,
+        }
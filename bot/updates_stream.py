@@ -0,0 +1,396 @@
+# bot/updates_stream.py
+# -*- coding: utf-8 -*-
+"""
+Горизонтальное масштабирование: ingress + N воркеров через Redis Streams.
+
+BOT_MODE=ingress — единственный процесс, получающий апдейты (long polling).
+Хендлеры он не вызывает: апдейт пишется в шард-стрим
+updates:stream:{user_id % UPDATE_SHARDS}, и только потом Telegram получает
+подтверждение (offset) — апдейт не теряется при рестарте ingress.
+Поэтому апдейты пишутся по одному, по порядку (handle_as_tasks=False):
+offset следующего getUpdates уходит только после XADD всей пачки.
+Недоступный Redis не роняет апдейт — XADD повторяется с backoff,
+а polling стоит (Telegram хранит неподтверждённые апдейты сутки).
+
+BOT_MODE=worker — сколько угодно реплик. Порядок важен на пользователя
+(переходы FSM в RedisStorage), поэтому:
+- каждый шард в любой момент читает один воркер — он держит аренду
+  updates:lease:{shard} (SET NX PX, продление/снятие Lua по токену);
+- внутри шарда у каждого пользователя своя очередь (_ShardLanes):
+  его апдейты обрабатываются и подтверждаются строго по порядку,
+  разные пользователи — параллельно, до SHARD_CONCURRENCY апдейтов на шард.
+  Медленный поиск держит только своего пользователя, а не весь шард;
+- шарды делятся поровну между живыми воркерами (heartbeat в updates:workers),
+  лишние аренды отдаются при ребалансировке;
+- XACK — только после обработки. Если воркер упал, аренда истекает,
+  шард забирает другой воркер и сначала дочитывает чужие неподтверждённые
+  записи (XAUTOCLAIM) — доставка at-least-once.
+
+Ошибка хендлера не блокирует шард: она логируется, запись подтверждается.
+Ошибка Redis при подтверждении останавливает чтение шарда — при ребалансировке
+его заново забирают и дочитывают неподтверждённое.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+
+from bot.config import settings
+from bot.utils import codec
+
+STREAM_KEY = "updates:stream:{shard}"
+LEASE_KEY = "updates:lease:{shard}"
+WORKERS_KEY = "updates:workers"
+GROUP = "workers"
+
+STREAM_MAXLEN = 100_000   # примерный предел длины шард-стрима (XADD MAXLEN ~)
+LEASE_TTL_MS = 15_000     # аренда шарда; воркер продлевает её каждые REBALANCE_EVERY
+REBALANCE_EVERY = 3.0     # секунды
+READ_COUNT = 10
+XADD_RETRY_BASE = 0.1     # первая пауза между повторами XADD в ingress, секунды
+XADD_RETRY_MAX = 5.0      # предел паузы
+READ_BLOCK_MS = 1000
+
+_RENEW_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def shard_for(key: int, shards: int) -> int:
+    return key % shards
+
+
+def stream_key(shard: int) -> str:
+    return STREAM_KEY.format(shard=shard)
+
+
+# --- Ingress ---
+
+class StreamIngressMiddleware(BaseMiddleware):
+    """
+    Outer middleware на dp.update в ingress-процессе: кладёт апдейт
+    в шард-стрим пользователя вместо вызова хендлеров.
+    """
+
+    def __init__(self, redis_conn: redis.Redis, shards: int):
+        self.redis = redis_conn
+        self.shards = shards
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        key = user.id if user else chat.id if chat else event.update_id
+
+        payload = codec.json_dumps(event.model_dump(mode="json", exclude_none=True))
+        stream = stream_key(shard_for(key, self.shards))
+        # key — очередь пользователя внутри шарда у воркера
+        fields = {"update": payload, "key": str(key)}
+        # Ошибку aiogram только залогирует и подтвердит offset — апдейт пропал бы.
+        # Повторяем, пока не запишем: polling ждёт, порядок сохраняется
+        delay = XADD_RETRY_BASE
+        while True:
+            try:
+                await self.redis.xadd(stream, fields, maxlen=STREAM_MAXLEN, approximate=True)
+                break
+            except redis.RedisError as e:
+                logging.warning(
+                    "Ingress XADD of update %s failed, retry in %.1fs: %s",
+                    event.update_id, delay, e,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, XADD_RETRY_MAX)
+        # Хендлеры не вызываем — апдейт обработает воркер
+
+
+async def run_ingress() -> None:
+    """Ingress: long polling → Redis Streams."""
+    from bot.handlers import user_handlers
+
+    redis_conn = redis.Redis(host='redis', port=6379, decode_responses=True)
+    bot = Bot(token=settings.BOT_TOKEN)
+    dp = Dispatcher()
+    dp.update.outer_middleware(StreamIngressMiddleware(redis_conn, settings.UPDATE_SHARDS))
+    # Роутер нужен только для allowed_updates — хендлеры в ingress не вызываются
+    dp.include_router(user_handlers.router)
+
+    try:
+        await bot.delete_webhook(drop_pending_updates=False)
+        logging.info("Запуск ingress: %d шардов", settings.UPDATE_SHARDS)
+        # Без задач на апдейт: offset подтверждается только после XADD,
+        # апдейты одного пользователя попадают в стрим в порядке Telegram
+        await dp.start_polling(
+            bot, allowed_updates=dp.resolve_used_update_types(), handle_as_tasks=False,
+        )
+    finally:
+        await bot.session.close()
+        await redis_conn.aclose()
+
+
+# --- Воркеры ---
+
+class StreamWorker:
+    """Читает свои шарды и скармливает апдейты диспетчеру."""
+
+    def __init__(
+        self,
+        redis_conn: redis.Redis,
+        bot: Bot,
+        dp: Dispatcher,
+        shards: int,
+        concurrency: int = 32,
+    ):
+        self.redis = redis_conn
+        self.bot = bot
+        self.dp = dp
+        self.shards = shards
+        self.concurrency = concurrency
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.token = uuid.uuid4().hex
+        # шард → (задача чтения, событие «остановиться после текущей записи»)
+        self._owned: Dict[int, Tuple[asyncio.Task, asyncio.Event]] = {}
+        self._renew = redis_conn.register_script(_RENEW_LEASE_LUA)
+        self._release = redis_conn.register_script(_RELEASE_LEASE_LUA)
+
+    async def run(self) -> None:
+        await self._ensure_groups()
+        logging.info("Worker %s: %d шардов в пуле", self.consumer, self.shards)
+        try:
+            while True:
+                try:
+                    await self._rebalance()
+                except Exception as e:
+                    logging.warning("Worker %s rebalance failed: %s", self.consumer, e)
+                await asyncio.sleep(REBALANCE_EVERY)
+        finally:
+            for shard in list(self._owned):
+                await self._drop(shard)
+            await self.redis.zrem(WORKERS_KEY, self.consumer)
+
+    async def _ensure_groups(self) -> None:
+        for shard in range(self.shards):
+            try:
+                await self.redis.xgroup_create(stream_key(shard), GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def _rebalance(self) -> None:
+        """Heartbeat, продление аренд, захват свободных шардов до своей доли."""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(WORKERS_KEY, {self.consumer: now})
+        pipe.zremrangebyscore(WORKERS_KEY, 0, now - LEASE_TTL_MS / 1000)
+        pipe.zcard(WORKERS_KEY)
+        _, _, alive = await pipe.execute()
+        fair = -(-self.shards // max(int(alive), 1))
+
+        # Продлеваем свои аренды; потерянные (истекли при паузе) — бросаем
+        for shard, (task, _stop) in list(self._owned.items()):
+            renewed = await self._renew(keys=[LEASE_KEY.format(shard=shard)], args=[self.token, LEASE_TTL_MS])
+            if not renewed or task.done():
+                error = task.exception() if task.done() and not task.cancelled() else None
+                logging.warning("Worker %s lost shard %d: %s", self.consumer, shard, error or "lease expired")
+                await self._drop(shard, graceful=False)
+
+        # Лишние шарды отдаём — их подхватят новые воркеры
+        while len(self._owned) > fair:
+            await self._drop(max(self._owned))
+
+        for shard in range(self.shards):
+            if len(self._owned) >= fair:
+                break
+            if shard in self._owned:
+                continue
+            acquired = await self.redis.set(
+                LEASE_KEY.format(shard=shard), self.token, nx=True, px=LEASE_TTL_MS,
+            )
+            if acquired:
+                logging.info("Worker %s took shard %d", self.consumer, shard)
+                stop = asyncio.Event()
+                self._owned[shard] = (asyncio.create_task(self._consume(shard, stop)), stop)
+
+    async def _drop(self, shard: int, graceful: bool = True) -> None:
+        """
+        Отдаёт шард. graceful — дождаться конца текущего апдейта и снять аренду;
+        иначе (аренда уже потеряна) — отменить чтение сразу.
+        """
+        task, stop = self._owned.pop(shard)
+        stop.set()
+        if graceful:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=LEASE_TTL_MS / 2000)
+            except asyncio.TimeoutError:
+                pass
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if graceful:
+            try:
+                await self._release(keys=[LEASE_KEY.format(shard=shard)], args=[self.token])
+            except Exception as e:
+                logging.warning("Worker %s: lease release failed for shard %d: %s", self.consumer, shard, e)
+
+    async def _consume(self, shard: int, stop: asyncio.Event) -> None:
+        stream = stream_key(shard)
+        lanes = _ShardLanes(self, stream, stop, self.concurrency)
+
+        try:
+            # Неподтверждённые записи прежнего владельца шарда — первыми, по порядку
+            start = "0-0"
+            while True:
+                room = await lanes.room()
+                if stop.is_set():
+                    break
+                start, claimed, *_ = await self.redis.xautoclaim(
+                    stream, GROUP, self.consumer, min_idle_time=0, start_id=start,
+                    count=min(room, READ_COUNT),
+                )
+                lanes.submit(claimed)
+                if start in ("0-0", b"0-0"):
+                    break
+
+            while not stop.is_set():
+                room = await lanes.room()
+                if stop.is_set():
+                    break
+                response = await self.redis.xreadgroup(
+                    GROUP, self.consumer, {stream: ">"},
+                    count=min(room, READ_COUNT), block=READ_BLOCK_MS,
+                )
+                for _stream, entries in response or []:
+                    lanes.submit(entries)
+
+            await lanes.join()
+        finally:
+            lanes.cancel()
+
+    async def _handle(self, stream: str, entry_id: str, fields: Optional[Dict[str, str]]) -> None:
+        if fields:
+            try:
+                update = Update.model_validate(
+                    codec.json_loads(fields["update"]), context={"bot": self.bot},
+                )
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logging.exception("Update %s from %s failed: %s", entry_id, stream, e)
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(stream, GROUP, entry_id)
+        pipe.xdel(stream, entry_id)
+        await pipe.execute()
+
+
+class _ShardLanes:
+    """
+    Очереди пользователей одного шарда.
+
+    Запись попадает в очередь своего key (id пользователя из ingress);
+    у непустой очереди одна задача, которая обрабатывает и подтверждает
+    записи по порядку. room() ждёт, пока в обработке меньше limit записей —
+    столько и читается из стрима.
+    Записи, не начатые к stop, остаются в PEL — их заберёт новый владелец шарда.
+    """
+
+    def __init__(self, worker: StreamWorker, stream: str, stop: asyncio.Event, limit: int):
+        self.worker = worker
+        self.stream = stream
+        self.stop = stop
+        self.limit = max(limit, 1)
+        self.inflight = 0
+        self.error: Optional[BaseException] = None
+        self._queues: Dict[str, Deque[Tuple[str, Optional[Dict[str, str]]]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._freed = asyncio.Event()
+
+    async def room(self) -> int:
+        """Сколько записей можно прочитать (≥ 1); ждёт освобождения места."""
+        while self.inflight >= self.limit and not self.stop.is_set():
+            self._raise()
+            self._freed.clear()
+            await self._freed.wait()
+        self._raise()
+        return self.limit - self.inflight
+
+    def submit(self, entries: List[Tuple[str, Optional[Dict[str, str]]]]) -> None:
+        for entry_id, fields in entries:
+            key = (fields or {}).get("key", "")
+            self.inflight += 1
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((entry_id, fields))
+                continue
+            self._queues[key] = deque([(entry_id, fields)])
+            task = asyncio.create_task(self._drain(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def join(self) -> None:
+        """Дождаться начатых записей (после stop — только текущих)."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._raise()
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+    async def _drain(self, key: str) -> None:
+        queue = self._queues[key]
+        try:
+            while queue and not self.stop.is_set():
+                entry_id, fields = queue[0]
+                await self.worker._handle(self.stream, entry_id, fields)
+                queue.popleft()
+                self.inflight -= 1
+                self._freed.set()
+        except Exception as e:
+            # XACK не прошёл — шард перечитает новый владелец; читать дальше нельзя
+            self.error = self.error or e
+            self.stop.set()
+        finally:
+            self.inflight -= len(queue)
+            del self._queues[key]
+            self._freed.set()
+
+    def _raise(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+
+async def run_worker() -> None:
+    """Воркер: Redis Streams → Dispatcher."""
+    from bot.main import bot_context  # main импортирует этот модуль
+
+    async with bot_context() as (bot, dp):
+        worker = StreamWorker(
+            dp.storage.redis, bot, dp, settings.UPDATE_SHARDS, settings.SHARD_CONCURRENCY,
+        )
+        await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+        try:
+            await worker.run()
+        finally:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
@@ -1,61 +1,397 @@
 # bot/utils/analytics.py
+"""
+Метрики использования бота в Redis.
+
+Хранение — временные бакеты трёх гранулярностей (час / день / ISO-неделя):
+- stats:{гранулярность}:{бакет}        — hash счётчиков: поиски, пустые
+  результаты, фичи (feature:{имя}:{значение}), кэш поиска (cache:{исход}),
+  гистограмма латентности поиска (latency:le_{мс}, latency:sum_ms, latency:count);
+- stats:{гранулярность}:{бакет}:users  — HyperLogLog уникальных пользователей
+  (~12 КБ на бакет вместо SET всех id, погрешность ~0.8%).
+Каждое событие сразу попадает во все три бакета — свёртка час → день → неделя
+делается при записи, одним и тем же pipeline, без фоновых пересчётов.
+У каждой гранулярности свой TTL (RETENTION) — память Redis не растёт бесконечно.
+
+get_range() читает любой диапазон бакетов одним pipeline;
+уникальные пользователи за диапазон — один PFCOUNT по всем HLL (объединение).
+
+track_* не ходят в Redis на пути запроса пользователя: события копятся
+в WriteBuffer (инкременты hash-полей и PFADD агрегируются по ключу)
+и уходят одним pipeline раз в FLUSH_INTERVAL или по достижении
+FLUSH_MAX_EVENTS. Буфер ограничен MAX_BUFFERED_EVENTS: если Redis недоступен
+дольше, новые события отбрасываются (счётчик dropped).
+При остановке бота буфер сбрасывается (Analytics.aclose).
+"""
+
+import asyncio
+import logging
 import redis.asyncio as redis
-from datetime import date
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, DefaultDict, Dict, List, Optional, Set, Tuple, Union
+
+from bot.utils import places_service
+from bot.utils.rate_limiter import ProviderQuota
+
+FLUSH_INTERVAL = 1.0         # секунды между сбросами буфера
+FLUSH_MAX_EVENTS = 500       # столько событий — сбрасываем не дожидаясь интервала
+MAX_BUFFERED_EVENTS = 50_000  # предел памяти буфера при недоступном Redis
+
+HOUR, DAY, WEEK = "hour", "day", "week"
+
+# Сколько хранится бакет каждой гранулярности, секунды
+RETENTION = {
+    HOUR: 3 * 24 * 3600,
+    DAY: 120 * 24 * 3600,
+    WEEK: 2 * 365 * 24 * 3600,
+}
+
+# Верхние границы корзин гистограммы латентности поиска, мс (последняя — всё остальное)
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000)
+
+# Исходы кэша поиска (places_service.CACHE_STATS), которые попадают в метрики
+CACHE_OUTCOMES = ("hit", "stale", "miss", "l1_hit", "catalogue_hit", "refresh")
+
+
+def bucket_id(granularity: str, moment: Union[date, datetime]) -> str:
+    """Идентификатор бакета: 2024-05-01T13 / 2024-05-01 / 2024-W18."""
+    if granularity == HOUR:
+        return moment.strftime("%Y-%m-%dT%H")
+    if granularity == DAY:
+        return moment.strftime("%Y-%m-%d")
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def stats_key(granularity: str, bucket: str) -> str:
+    return f"stats:{granularity}:{bucket}"
+
+
+def users_key(granularity: str, bucket: str) -> str:
+    return f"stats:{granularity}:{bucket}:users"
+
+
+def _latency_field(ms: float) -> str:
+    for bound in LATENCY_BUCKETS_MS:
+        if ms <= bound:
+            return f"latency:le_{bound}"
+    return "latency:le_inf"
+
+
+class WriteBuffer:
+    """Агрегирует записи метрик и сбрасывает их в Redis одним pipeline."""
+
+    def __init__(
+        self,
+        redis_conn: redis.Redis,
+        flush_interval: float = FLUSH_INTERVAL,
+        flush_max_events: int = FLUSH_MAX_EVENTS,
+        max_events: int = MAX_BUFFERED_EVENTS,
+    ):
+        self.r = redis_conn
+        self.flush_interval = flush_interval
+        self.flush_max_events = flush_max_events
+        self.max_events = max_events
+        self.stats: Counter = Counter()
+        self._events = 0
+        self._hll: DefaultDict[str, Set[str]] = defaultdict(set)
+        self._hashes: DefaultDict[str, Counter] = defaultdict(Counter)
+        self._ttl: Dict[str, int] = {}
+        # Вызывается перед каждым сбросом — дописать в буфер снимки счётчиков процесса
+        self.on_flush: Optional[Callable[[], None]] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return self._events
+
+    def _accept(self) -> bool:
+        if self._events >= self.max_events:
+            self.stats["dropped"] += 1
+            return False
+        self._events += 1
+        if self._events >= self.flush_max_events:
+            self._wakeup.set()
+        return True
+
+    def pfadd(self, key: str, member: Any, ttl: int) -> None:
+        if self._accept():
+            self._hll[key].add(str(member))
+            self._ttl[key] = ttl
+
+    def hincrby(self, key: str, field: str, amount: int, ttl: int) -> None:
+        if self._accept():
+            self._hashes[key][field] += amount
+            self._ttl[key] = ttl
+
+    async def flush(self) -> None:
+        """Всё накопленное — одним pipeline. При ошибке события возвращаются в буфер."""
+        async with self._lock:
+            if self.on_flush is not None:
+                self.on_flush()
+            if not self._events:
+                return
+            hll, hashes, ttl = self._hll, self._hashes, self._ttl
+            events = self._events
+            self._hll, self._hashes, self._ttl = defaultdict(set), defaultdict(Counter), {}
+            self._events = 0
+
+            pipe = self.r.pipeline(transaction=False)
+            for key, members in hll.items():
+                pipe.pfadd(key, *members)
+            for key, fields in hashes.items():
+                for field, amount in fields.items():
+                    pipe.hincrby(key, field, amount)
+            for key, seconds in ttl.items():
+                pipe.expire(key, seconds)
+
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logging.warning("Analytics flush failed (%d events kept): %s", events, e)
+                self._restore(hll, hashes, ttl, events)
+                return
+            self.stats["flushes"] += 1
+            self.stats["flushed_events"] += events
+
+    def _restore(self, hll, hashes, ttl: Dict[str, int], events: int) -> None:
+        for key, members in hll.items():
+            self._hll[key] |= members
+        for key, fields in hashes.items():
+            self._hashes[key].update(fields)
+        for key, seconds in ttl.items():
+            self._ttl.setdefault(key, seconds)
+        self._events += events
+
+    async def run(self) -> None:
+        """Фоновый сброс по интервалу или по числу событий."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
 
 
 class Analytics:
-    def __init__(self, redis_conn: redis.Redis):
+    def __init__(
+        self,
+        redis_conn: redis.Redis,
+        quota: Optional[ProviderQuota] = None,
+        outbound: Optional[Any] = None,
+        client_cache: Optional[Any] = None,
+    ):
         # Переиспользуем соединение из main.py — нет дублирующего connection pool
         self.r = redis_conn
+        # Запись метрик — отложенная, пачками (WriteBuffer)
+        self.buffer = WriteBuffer(redis_conn)
+        self.buffer.on_flush = self._collect_cache_stats
+        # Счётчики кэша поиска, уже отправленные в метрики
+        self._cache_seen: Dict[str, int] = places_service.get_cache_stats()
+        # Квоты провайдеров — для отчёта об остатке (get_provider_quota)
+        self.quota = quota
+        # Планировщик исходящих сообщений — глубина очередей и ожидание (OutboundScheduler.snapshot)
+        self.outbound = outbound
+        # Клиентский кэш горячих ключей — доля попаданий (TrackedCache.snapshot)
+        self.client_cache = client_cache
 
     def _get_today_str(self) -> str:
         """Возвращает сегодняшнюю дату в формате ГГГГ-ММ-ДД."""
         return date.today().isoformat()
 
+    def start(self) -> None:
+        """Запускает фоновый сброс буфера метрик."""
+        self.buffer.start()
+
+    async def aclose(self) -> None:
+        """Сбрасывает накопленные метрики — вызывается при остановке бота."""
+        await self.buffer.aclose()
+
+    # --- Запись ---
+
+    def _buckets(self) -> List[Tuple[str, str]]:
+        now = datetime.now()
+        return [(g, bucket_id(g, now)) for g in (HOUR, DAY, WEEK)]
+
+    def _count(self, field: str, amount: int = 1) -> None:
+        for granularity, bucket in self._buckets():
+            self.buffer.hincrby(stats_key(granularity, bucket), field, amount, RETENTION[granularity])
+
     async def track_user(self, user_id: int):
-        """Отмечает уникального пользователя за сегодняшний день."""
-        await self.r.sadd(f"stats:users:daily:{self._get_today_str()}", user_id)
+        """Отмечает уникального пользователя (HyperLogLog часа, дня и недели)."""
+        for granularity, bucket in self._buckets():
+            self.buffer.pfadd(users_key(granularity, bucket), user_id, RETENTION[granularity])
 
     async def track_search_request(self):
-        """Увеличивает счётчик успешных поисков за день."""
-        await self.r.incr(f"stats:searches:daily:{self._get_today_str()}")
+        """Увеличивает счётчик успешных поисков."""
+        self._count("searches")
 
     async def track_empty_result(self):
-        """Увеличивает счётчик «пустых» результатов за день."""
-        await self.r.incr(f"stats:empty_results:daily:{self._get_today_str()}")
+        """Увеличивает счётчик «пустых» результатов."""
+        self._count("empty_results")
 
     async def track_share_button_click(self):
         """Увеличивает счётчик нажатий на кнопку «Поделиться»."""
-        await self.r.incr(f"stats:shares:daily:{self._get_today_str()}")
+        self._count("shares")
 
     async def track_feedback_request(self):
         """Увеличивает счётчик запросов обратной связи."""
-        await self.r.incr(f"stats:feedback:daily:{self._get_today_str()}")
+        self._count("feedback")
 
     async def track_feature_use(self, feature: str, value):
         """Отслеживает использование конкретной фичи (например, радиуса)."""
-        await self.r.hincrby(f"stats:features:{feature}:{self._get_today_str()}", str(value), 1)
+        self._count(f"feature:{feature}:{value}")
 
-    async def get_today_stats(self) -> dict:
-        """Собирает всю статистику за сегодня одним pipeline."""
-        today = self._get_today_str()
+    async def track_search_latency(self, seconds: float):
+        """Время поиска от нажатия до результата — в гистограмму латентности."""
+        ms = seconds * 1000
+        self._count(_latency_field(ms))
+        self._count("latency:sum_ms", int(ms))
+        self._count("latency:count")
 
-        pipe = self.r.pipeline()
-        pipe.scard(f"stats:users:daily:{today}")
-        pipe.get(f"stats:searches:daily:{today}")
-        pipe.get(f"stats:empty_results:daily:{today}")
-        pipe.get(f"stats:feedback:daily:{today}")
-        pipe.hgetall(f"stats:features:radius:{today}")
-        pipe.hgetall(f"stats:features:rating:{today}")
+    def _collect_cache_stats(self) -> None:
+        """Прирост счётчиков кэша поиска с прошлого сброса (WriteBuffer.on_flush)."""
+        current = places_service.get_cache_stats()
+        for outcome in CACHE_OUTCOMES:
+            delta = current.get(outcome, 0) - self._cache_seen.get(outcome, 0)
+            if delta > 0:
+                self._count(f"cache:{outcome}", delta)
+        self._cache_seen = current
+
+    # --- Чтение ---
+
+    async def get_range(
+        self,
+        start: Union[date, datetime],
+        end: Union[date, datetime],
+        granularity: str = DAY,
+    ) -> Dict[str, Any]:
+        """
+        Метрики по бакетам от start до end включительно — одним pipeline.
+        unique_users — уникальные пользователи за весь диапазон (объединение HLL).
+        """
+        await self.buffer.flush()  # отчёт видит и ещё не сброшенные события
+
+        step = {HOUR: timedelta(hours=1), DAY: timedelta(days=1), WEEK: timedelta(weeks=1)}[granularity]
+        if granularity == HOUR and not isinstance(start, datetime):
+            start = datetime.combine(start, datetime.min.time())
+        if granularity == HOUR and not isinstance(end, datetime):
+            end = datetime.combine(end, datetime.max.time())
+        buckets: List[str] = []
+        moment = start
+        while moment <= end:
+            bucket = bucket_id(granularity, moment)
+            if bucket not in buckets:
+                buckets.append(bucket)
+            moment += step
+        if bucket_id(granularity, end) not in buckets:
+            buckets.append(bucket_id(granularity, end))
 
+        pipe = self.r.pipeline(transaction=False)
+        for bucket in buckets:
+            pipe.hgetall(stats_key(granularity, bucket))
+            pipe.pfcount(users_key(granularity, bucket))
+        pipe.pfcount(*[users_key(granularity, b) for b in buckets])
         results = await pipe.execute()
 
+        rows = []
+        for i, bucket in enumerate(buckets):
+            row = _summarize(results[2 * i])
+            row["bucket"] = bucket
+            row["active_users"] = results[2 * i + 1]
+            rows.append(row)
+        return {"granularity": granularity, "buckets": rows, "unique_users": results[-1]}
+
+    async def get_provider_quota(self) -> dict:
+        """Использовано / лимит / остаток дневной квоты по провайдерам одним pipeline."""
+        if self.quota is None:
+            return {}
+
+        providers = [p for p, limit in self.quota.limits.items() if limit.daily]
+        pipe = self.r.pipeline()
+        for provider in providers:
+            pipe.get(self.quota.daily_key(provider, self._get_today_str()))
+        results = await pipe.execute()
+
+        report = {}
+        for provider, used in zip(providers, results):
+            limit = self.quota.limits[provider].daily
+            used = int(used or 0)
+            report[provider] = {"used": used, "limit": limit, "remaining": max(limit - used, 0)}
+        return report
+
+    async def get_today_stats(self) -> dict:
+        """Вся статистика за сегодня: дневной бакет + состояние процесса."""
+        today = date.today()
+        day = (await self.get_range(today, today))["buckets"][0]
+
         return {
-            "active_users": results[0],
-            "searches": int(results[1] or 0),
-            "empty_results": int(results[2] or 0),
-            "feedback": int(results[3] or 0),
-            "radius_usage": results[4],
-            "rating_usage": results[5],
+            **day,
+            "provider_quota": await self.get_provider_quota(),
+            "outbound": self.outbound.snapshot() if self.outbound is not None else {},
+            "client_cache": self.client_cache.snapshot() if self.client_cache is not None else {},
+            "buffer": {"pending": len(self.buffer), **self.buffer.stats},
         }
 
+
+def _summarize(raw: Dict[str, str]) -> Dict[str, Any]:
+    """Hash бакета → счётчики, использование фич, кэш и латентность."""
+    counters = {field: int(value) for field, value in raw.items()}
+
+    features: DefaultDict[str, Dict[str, int]] = defaultdict(dict)
+    cache: Dict[str, int] = {}
+    histogram: Dict[str, int] = {}
+    for field, value in counters.items():
+        if field.startswith("feature:"):
+            _, feature, option = field.split(":", 2)
+            features[feature][option] = value
+        elif field.startswith("cache:"):
+            cache[field[len("cache:"):]] = value
+        elif field.startswith("latency:le_"):
+            histogram[field[len("latency:le_"):]] = value
+
+    lookups = cache.get("hit", 0) + cache.get("stale", 0) + cache.get("miss", 0)
+    count = counters.get("latency:count", 0)
+
+    return {
+        "searches": counters.get("searches", 0),
+        "empty_results": counters.get("empty_results", 0),
+        "shares": counters.get("shares", 0),
+        "feedback": counters.get("feedback", 0),
+        "radius_usage": features.get("radius", {}),
+        "rating_usage": features.get("rating", {}),
+        "cache": cache,
+        "cache_hit_rate": round((lookups - cache.get("miss", 0)) / lookups, 3) if lookups else None,
+        "latency_ms": {
+            "count": count,
+            "avg": round(counters.get("latency:sum_ms", 0) / count) if count else None,
+            "p50": _histogram_quantile(histogram, count, 0.5),
+            "p95": _histogram_quantile(histogram, count, 0.95),
+            "histogram": histogram,
+        },
+    }
+
+
+def _histogram_quantile(histogram: Dict[str, int], count: int, q: float) -> Optional[str]:
+    """Верхняя граница корзины, в которую попадает квантиль q (≤ N мс)."""
+    if not count:
+        return None
+    seen = 0
+    for bound in [*map(str, LATENCY_BUCKETS_MS), "inf"]:
+        seen += histogram.get(bound, 0)
+        if seen >= q * count:
+            return f"<={bound}"
+    return "<=inf"
@@ -0,0 +1,167 @@
+# bot/utils/client_cache.py
+# -*- coding: utf-8 -*-
+"""
+Клиентский кэш Redis с серверной инвалидацией (RESP3 CLIENT TRACKING).
+
+user_lang:{id} читается на каждом апдейте, а меняется раз в жизни пользователя.
+TrackedCache держит такие ключи в памяти процесса:
+- отдельное RESP3-соединение включает
+  CLIENT TRACKING ON BCAST PREFIX <префикс>... — Redis присылает push
+  "invalidate" на любую запись ключа с этими префиксами, от любой реплики;
+- кэшируются только ключи из белого списка префиксов (CLIENT_CACHE_PREFIXES),
+  LRU на CLIENT_CACHE_MAX_ENTRIES записей;
+- пока соединение отслеживания не поднято (или упало) — кэш пуст и не
+  заполняется, все чтения идут в Redis; после разрыва кэш сбрасывается;
+- значение, прочитанное во время инвалидации, в кэш не попадает
+  (эпоха инвалидаций, см. begin_fill / fill);
+- hits / misses / invalidations — snapshot().
+
+Включается CLIENT_CACHE_ENABLED; нужен Redis 6+ и redis-py 5.1+
+(обработчик push-инвалидаций парсера). На старом redis-py listen()
+один раз предупреждает и выходит — кэш остаётся выключенным.
+"""
+
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis
+from redis.asyncio import Connection
+
+CLIENT_CACHE_MAX_ENTRIES = 50_000
+CLIENT_CACHE_PREFIXES = ("user_lang:",)
+RECONNECT_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+_MISS = object()
+
+
+class TrackedCache:
+    """Локальная копия горячих ключей, которую Redis инвалидирует сам."""
+
+    def __init__(
+        self,
+        redis_conn,
+        prefixes: Iterable[str] = CLIENT_CACHE_PREFIXES,
+        max_entries: int = CLIENT_CACHE_MAX_ENTRIES,
+    ):
+        self.redis = redis_conn
+        self.prefixes = tuple(prefixes)
+        self.max_entries = max_entries
+        self.ready = False        # отслеживание включено — кэшу можно верить
+        self.stats: Counter = Counter()
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    # --- Чтение ---
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(True, значение) из памяти или (False, None) — читать из Redis."""
+        if not self.ready or not self.tracks(key):
+            return False, None
+        value = self._data.get(key, _MISS)
+        if value is _MISS:
+            self.stats["misses"] += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return True, value
+
+    def begin_fill(self) -> int:
+        """Эпоха перед чтением из Redis — передаётся в fill()."""
+        return self._epoch
+
+    def fill(self, key: str, value: Any, epoch: int) -> None:
+        """Кладёт прочитанное значение, если с begin_fill() не было инвалидаций."""
+        if not self.ready or epoch != self._epoch or not self.tracks(key):
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # --- Инвалидация ---
+
+    def invalidate(self, keys: Optional[Iterable[Any]]) -> None:
+        """keys=None — сбросить всё (FLUSHALL или потеря соединения)."""
+        self._epoch += 1
+        if keys is None:
+            self._data.clear()
+            self.stats["flushes"] += 1
+            return
+        for key in keys:
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            if self._data.pop(key, _MISS) is not _MISS:
+                self.stats["invalidations"] += 1
+
+    async def _on_invalidate(self, response) -> None:
+        # ["invalidate", [key, ...]] или ["invalidate", None]
+        self.invalidate(response[1] if len(response) > 1 else None)
+
+    async def listen(self) -> None:
+        """
+        Держит соединение отслеживания и применяет push-инвалидации.
+        Запускается фоновой задачей из bot/main.py.
+        """
+        delay = RECONNECT_DELAY
+        kwargs = dict(self.redis.connection_pool.connection_kwargs, protocol=3)
+        kwargs.pop("connection_class", None)
+
+        # Обработчик push-инвалидаций — внутренний API парсера redis-py (с 5.1)
+        if not hasattr(Connection(**kwargs)._parser, "set_invalidation_push_handler"):
+            logging.warning(
+                "Client-side cache disabled: redis-py %s has no invalidation push handler (need 5.1+)",
+                redis.__version__,
+            )
+            return
+
+        while True:
+            conn = Connection(**kwargs)
+            try:
+                await conn.connect()
+                conn._parser.set_invalidation_push_handler(self._on_invalidate)
+                prefixes = [arg for p in self.prefixes for arg in ("PREFIX", p)]
+                await conn.send_command("CLIENT", "TRACKING", "ON", "BCAST", *prefixes)
+                reply = await conn.read_response()
+                if isinstance(reply, Exception):
+                    raise reply
+
+                self.invalidate(None)
+                self.ready = True
+                delay = RECONNECT_DELAY
+                logging.info("Client-side cache tracking on: %s", ", ".join(self.prefixes))
+
+                while True:
+                    await conn.read_response(push_request=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning("Client-side cache tracking lost: %s", e)
+            finally:
+                self.ready = False
+                self.invalidate(None)
+                await conn.disconnect()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    # --- Метрики ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits, misses = self.stats["hits"], self.stats["misses"]
+        lookups = hits + misses
+        return {
+            "ready": self.ready,
+            "entries": len(self._data),
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            **self.stats,
+        }
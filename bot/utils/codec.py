@@ -0,0 +1,158 @@
+# bot/utils/codec.py
+# -*- coding: utf-8 -*-
+"""
+Кодеки для ответов провайдеров и значений кэша в Redis.
+
+- Ответы провайдеров разбираются orjson (если установлен) вместо r.json().
+- Значения кэша — компактный бинарный формат с заголовком:
+
+      b"BP" | версия схемы (1 байт) | кодек (1 байт) | тело
+
+  кодек: msgpack (если установлен) или JSON, старший бит — сжатие zlib.
+  Запись с чужой версией схемы читается как промах, а не как ошибка —
+  смена формата не ломает работающие реплики. Записи без заголовка
+  (старый JSON) по-прежнему читаются.
+
+Для бинарных значений нужен Redis-клиент без decode_responses —
+binary_client() строит его с теми же параметрами подключения,
+close_binary_client() закрывает его пул при остановке бота.
+
+Сравнение кодеков на типичной записи тайла: benchmarks/codec_bench.py.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен — есть stdlib json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен — пишем JSON
+    msgpack = None
+
+MAGIC = b"BP"
+SCHEMA_VERSION = 1
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+FLAG_ZLIB = 0x80
+
+COMPRESS_MIN = 1024   # тела меньше этого не сжимаем
+COMPRESS_LEVEL = 1    # быстрое сжатие — декод важнее степени сжатия
+
+
+class SchemaMismatch(ValueError):
+    """Запись кэша другой версии схемы — читать как промах."""
+
+
+# --- JSON ---
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+# --- Значения кэша ---
+
+def default_codec() -> int:
+    return CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+
+
+def pack(obj: Any, codec: Optional[int] = None, compress: bool = True) -> bytes:
+    """Сериализует obj с заголовком версии схемы."""
+    codec = default_codec() if codec is None else codec
+    if codec == CODEC_MSGPACK:
+        body = msgpack.packb(obj, use_bin_type=True)
+    else:
+        body = json_dumps(obj)
+
+    if compress and len(body) >= COMPRESS_MIN:
+        body = zlib.compress(body, COMPRESS_LEVEL)
+        codec |= FLAG_ZLIB
+
+    return MAGIC + bytes((SCHEMA_VERSION, codec)) + body
+
+
+def unpack(payload: Union[bytes, str]) -> Any:
+    """
+    Обратное pack(). Запись без заголовка считается старым JSON.
+    SchemaMismatch — запись другой версии схемы (или неизвестного кодека).
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if not payload.startswith(MAGIC):
+        return json_loads(payload)
+
+    version, codec = payload[2], payload[3]
+    if version != SCHEMA_VERSION:
+        raise SchemaMismatch(f"cache schema v{version}, expected v{SCHEMA_VERSION}")
+
+    body = payload[4:]
+    if codec & FLAG_ZLIB:
+        body = zlib.decompress(body)
+        codec &= ~FLAG_ZLIB
+
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise SchemaMismatch("msgpack entry but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False)
+    if codec == CODEC_JSON:
+        return json_loads(body)
+    raise SchemaMismatch(f"unknown cache codec {codec}")
+
+
+def available_codecs() -> List[Tuple[str, int, bool]]:
+    """(название, кодек, сжатие) — всё, что доступно в этом окружении."""
+    variants = [("json", CODEC_JSON, False), ("json+zlib", CODEC_JSON, True)]
+    if msgpack is not None:
+        variants += [("msgpack", CODEC_MSGPACK, False), ("msgpack+zlib", CODEC_MSGPACK, True)]
+    return variants
+
+
+# --- Redis-клиент для бинарных значений ---
+
+# id(текстовый клиент) → (текстовый клиент, бинарный клиент);
+# ссылка на текстовый держит id от переиспользования
+_binary_clients: Dict[int, Tuple[Any, Any]] = {}
+
+
+def binary_client(redis_conn):
+    """
+    Клиент Redis без decode_responses с теми же параметрами подключения
+    (отдельный пул). Если redis_conn уже бинарный — он сам.
+    """
+    pool = redis_conn.connection_pool
+    if not pool.connection_kwargs.get("decode_responses"):
+        return redis_conn
+
+    cached = _binary_clients.get(id(redis_conn))
+    if cached is not None:
+        return cached[1]
+
+    kwargs = dict(pool.connection_kwargs, decode_responses=False)
+    binary_pool = pool.__class__(
+        connection_class=pool.connection_class,
+        max_connections=pool.max_connections,
+        **kwargs,
+    )
+    client = redis_conn.__class__(connection_pool=binary_pool)
+    _binary_clients[id(redis_conn)] = (redis_conn, client)
+    return client
+
+
+async def close_binary_client(redis_conn) -> None:
+    """Закрывает пул binary_client(redis_conn), если он создавался (bot_context)."""
+    cached = _binary_clients.pop(id(redis_conn), None)
+    if cached is not None:
+        await cached[1].aclose()
@@ -0,0 +1,196 @@
+# bot/utils/entity_resolution.py
+# -*- coding: utf-8 -*-
+"""
+Слияние одного и того же заведения от разных провайдеров.
+
+Раньше _deduplicate отбрасывал только точные совпадения (имя + float-координаты):
+кафе из Mapbox и оно же из Foursquare оставались двумя кандидатами, и копия
+Mapbox так и жила с rating=None. К тому же после каждого ответа провайдера
+дедупликация заново шла по всему растущему списку.
+
+PlaceResolver добавляет кандидатов по мере ответов провайдеров (add):
+- пространственная хеш-сетка с ячейкой MATCH_DISTANCE: новый кандидат
+  сравнивается только с записями своей и 8 соседних ячеек;
+- совпадение — тот же place_id или расстояние ≤ MATCH_DISTANCE
+  и похожие имена (normalize_name: регистр, диакритика, пунктуация;
+  числа в именах должны совпадать; затем равенство, вложение значимых слов
+  или SequenceMatcher ≥ NAME_SIMILARITY);
+- совпавшие записи сливаются (merge_places): рейтинг, число оценок, адрес,
+  типы, цена и часы дополняют друг друга;
+- кандидаты без координат сливаются только по имени.
+Время — O(n) на весь поиск при ограниченной плотности мест в ячейке.
+"""
+
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import replace
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bot.utils import metrics
+from bot.utils.place import Place
+
+MATCH_DISTANCE = 40.0      # метров: расхождение координат одного места у провайдеров
+NAME_SIMILARITY = 0.85     # порог SequenceMatcher.ratio() нормализованных имён
+
+# Слова, совпадения по которым ещё не значат, что это одно место
+GENERIC_WORDS = frozenset({
+    "cafe", "coffee", "restaurant", "bar", "pub", "bistro", "the",
+    "quan", "nha", "hang", "ca", "phe", "com", "pho", "bun",
+})
+
+_METERS_PER_DEGREE = 111_320.0
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+_NUMBERS = re.compile(r"\d+")
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """'Phở Hòa — Pasteur' → 'pho hoa pasteur'."""
+    if not name:
+        return ""
+    name = name.lower().replace("đ", "d")
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", name).split())
+
+
+def names_match(a: str, b: str) -> bool:
+    """Похожи ли нормализованные имена."""
+    if not a or not b:
+        return False
+    if a == b:
+        return True
+
+    # «Phở 24» и «Phở 2», «Circle K 12» и «Circle K 13» — разные места
+    if _NUMBERS.findall(a) != _NUMBERS.findall(b):
+        return False
+
+    short, long = sorted((a.split(), b.split()), key=len)
+    if set(short) <= set(long) and set(short) - GENERIC_WORDS:
+        # «Highlands Coffee» ⊂ «Highlands Coffee Nguyễn Huệ»
+        return True
+
+    return SequenceMatcher(None, a, b).ratio() >= NAME_SIMILARITY
+
+
+def _richness(place: Place) -> Tuple[bool, int]:
+    return place.rating is not None, place.user_ratings_total
+
+
+def merge_places(a: Place, b: Place) -> Place:
+    """
+    Одна запись из двух копий места. Основой берётся копия с рейтингом
+    (и с большим числом оценок) — её id, имя и координаты; пустые поля
+    дополняются из второй.
+    """
+    primary, other = (a, b) if _richness(a) >= _richness(b) else (b, a)
+    return replace(
+        primary,
+        lat=primary.lat if primary.located else other.lat,
+        lon=primary.lon if primary.located else other.lon,
+        rating=primary.rating if primary.rating is not None else other.rating,
+        user_ratings_total=max(primary.user_ratings_total, other.user_ratings_total),
+        types=primary.types + tuple(t for t in other.types if t not in primary.types),
+        primary_type=primary.primary_type or other.primary_type,
+        vicinity=_longer(primary.vicinity, other.vicinity),
+        price_level=primary.price_level if primary.price_level is not None else other.price_level,
+        open_now=primary.open_now if primary.open_now is not None else other.open_now,
+    )
+
+
+def _longer(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    # Полный адрес («12 Nguyễn Huệ, Quận 1, …») информативнее короткого
+    if not a or (b and len(b) > len(a)):
+        return b
+    return a
+
+
+class PlaceResolver:
+    """Инкрементальное слияние кандидатов одного поиска."""
+
+    def __init__(self, match_distance: float = MATCH_DISTANCE):
+        self.match_distance = match_distance
+        self.merges = 0
+        self._records: List[Place] = []
+        self._names: List[str] = []
+        self._xy: List[Optional[Tuple[float, float]]] = []
+        self._grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._by_id: Dict[str, int] = {}
+        self._unlocated: Dict[str, int] = {}
+        self._cos_lat: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def places(self) -> List[Place]:
+        return list(self._records)
+
+    def add(self, places: Iterable[Place]) -> List[Place]:
+        """Добавляет ответ провайдера; возвращает текущий слитый набор."""
+        with metrics.stage(metrics.STAGE_DEDUP):
+            for place in places:
+                self._add(place)
+        return list(self._records)
+
+    # --- Внутреннее ---
+
+    def _project(self, place: Place) -> Tuple[float, float]:
+        # Равнопромежуточная проекция вокруг первого места — для десятков метров точна
+        if self._cos_lat is None:
+            self._cos_lat = math.cos(math.radians(float(place.lat)))
+        return (
+            float(place.lon) * _METERS_PER_DEGREE * self._cos_lat,
+            float(place.lat) * _METERS_PER_DEGREE,
+        )
+
+    def _cell(self, xy: Tuple[float, float]) -> Tuple[int, int]:
+        return int(xy[0] // self.match_distance), int(xy[1] // self.match_distance)
+
+    def _find(self, place: Place, name: str, xy: Optional[Tuple[float, float]]) -> Optional[int]:
+        if place.place_id is not None and place.place_id in self._by_id:
+            return self._by_id[place.place_id]
+
+        if xy is None:
+            return self._unlocated.get(name) if name else None
+
+        cx, cy = self._cell(xy)
+        best, best_distance = None, self.match_distance
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for index in self._grid.get((cx + dx, cy + dy), ()):
+                    other = self._xy[index]
+                    distance = math.hypot(xy[0] - other[0], xy[1] - other[1])
+                    if distance <= best_distance and names_match(name, self._names[index]):
+                        best, best_distance = index, distance
+        return best
+
+    def _add(self, place: Place) -> None:
+        name = normalize_name(place.name)
+        xy = self._project(place) if place.located else None
+
+        index = self._find(place, name, xy)
+        if index is not None:
+            self._records[index] = merge_places(self._records[index], place)
+            self.merges += 1
+        else:
+            index = len(self._records)
+            self._records.append(place)
+            self._names.append(name)
+            self._xy.append(xy)
+            # Ячейка — по координатам первой копии; последующие слияния
+            # сдвигают запись не дальше MATCH_DISTANCE, соседние ячейки это покрывают
+            if xy is not None:
+                self._grid[self._cell(xy)].append(index)
+            elif name:
+                self._unlocated[name] = index
+
+        if place.place_id is not None:
+            self._by_id[place.place_id] = index
+
+
+def resolve(places: Iterable[Place]) -> List[Place]:
+    """Слияние готового набора (например, ответа каталога) за один проход."""
+    return PlaceResolver().add(places)
@@ -15,10 +15,14 @@
 
 import asyncio
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import httpx
 
+from bot.utils import codec
+from bot.utils.http_client import ProviderHttp
+from bot.utils.place import Place
+
 # Маппинг: имя типа → ID категории Foursquare
 # Полный список: https://docs.foursquare.com/data-products/docs/categories
 CATEGORY_MAP: Dict[str, str] = {
@@ -29,7 +33,7 @@ CATEGORY_MAP: Dict[str, str] = {
 
 
 async def _fetch_by_category(
-    client: httpx.AsyncClient,
+    http: ProviderHttp,
     api_key: str,
     lat: float,
     lon: float,
@@ -62,23 +66,23 @@ async def _fetch_by_category(
     }
 
     try:
-        r = await client.get(url, headers=headers, params=params, timeout=10.0)
+        r = await http.get("foursquare", url, headers=headers, params=params)
         if not r.is_success:
             logging.error(
                 "FSQ error for category %s: HTTP %s — %s",
                 category_id, r.status_code, r.text[:300],
             )
             return []
-        data = r.json()
+        data = codec.json_loads(r.content)
         return data.get("results", [])
     except httpx.RequestError as e:
         logging.error("FSQ request error for category %s: %s", category_id, e)
         return []
 
 
-def _normalize_place(p: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize_place(p: Dict[str, Any]) -> Place:
     """
-    Приводит объект FSQ к той же схеме, что google_maps_api._normalize_place.
+    Приводит объект FSQ к общей модели Place.
     Рейтинг делится на 2: FSQ 0–10 → 0–5 (совместимо с фильтром).
     """
     loc = p.get("location") or {}
@@ -91,24 +95,19 @@ def _normalize_place(p: Dict[str, Any]) -> Dict[str, Any]:
 
     primary_type = cats[0].get("name", "point_of_interest") if cats else "point_of_interest"
 
-    return {
-        "place_id": p.get("fsq_id"),
-        "name": p.get("name"),
-        "rating": rating,
-        "user_ratings_total": (p.get("stats") or {}).get("total_ratings", 0),
-        "types": [c.get("name", "") for c in cats],
-        "primary_type": primary_type,
-        "lat": geo.get("latitude"),
-        "lon": geo.get("longitude"),
-        "vicinity": loc.get("formatted_address") or loc.get("address"),
-        "price_level": p.get("price"),
-        "business_status": "OPERATIONAL",
-        "opening_hours": {"open_now": hours.get("open_now")},
-        "photos": [],
-        "icon": None,
-        "icon_background_color": None,
-        "permanently_closed": None,
-    }
+    return Place(
+        place_id=p.get("fsq_id"),
+        name=p.get("name"),
+        rating=rating,
+        user_ratings_total=(p.get("stats") or {}).get("total_ratings", 0),
+        types=tuple(c.get("name", "") for c in cats),
+        primary_type=primary_type,
+        lat=geo.get("latitude"),
+        lon=geo.get("longitude"),
+        vicinity=loc.get("formatted_address") or loc.get("address"),
+        price_level=p.get("price"),
+        open_now=hours.get("open_now"),
+    )
 
 
 async def find_places(
@@ -120,19 +119,28 @@ async def find_places(
     min_rating: float,
     max_rating: float,
     lang_code: str,
-) -> List[Dict[str, Any]]:
+    http: Optional[ProviderHttp] = None,
+) -> List[Place]:
     """
     Ищет заведения (restaurant / cafe / bar) через Foursquare Places API.
     Параллельные запросы по категориям, дедупликация по fsq_id,
     фильтрация по диапазону рейтинга [min_rating, max_rating] (шкала 0–5).
     Сигнатура идентична google_maps_api.find_places.
+    http — общий пул соединений; без него создаётся временный.
     """
-    async with httpx.AsyncClient() as client:
+    owned = http is None
+    if owned:
+        http = ProviderHttp()
+
+    try:
         tasks = [
-            _fetch_by_category(client, api_key, lat, lon, radius, cat_id, lang_code)
+            _fetch_by_category(http, api_key, lat, lon, radius, cat_id, lang_code)
             for cat_id in CATEGORY_MAP.values()
         ]
         nested = await asyncio.gather(*tasks)
+    finally:
+        if owned:
+            await http.aclose()
 
     # Дедупликация по fsq_id
     seen: set = set()
@@ -147,12 +155,8 @@ async def find_places(
     normalized = [_normalize_place(p) for p in raw]
 
     # Фильтр по рейтингу
-    def in_range(p: Dict[str, Any]) -> bool:
-        r = p.get("rating")
-        try:
-            r_val = float(r) if r is not None else 0.0
-        except (TypeError, ValueError):
-            r_val = 0.0
+    def in_range(p: Place) -> bool:
+        r_val = p.rating if p.rating is not None else 0.0
         return float(min_rating) <= r_val <= float(max_rating)
 
     return [p for p in normalized if in_range(p)]
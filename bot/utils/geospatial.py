@@ -1,7 +1,18 @@
 import math
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен — есть чистый Python
+    np = None
+
+EARTH_RADIUS = 6371000
+
+# С какого размера батча выгоднее numpy (иначе накладные расходы дороже)
+NUMPY_MIN_BATCH = 32
 
 def calculate_distance(lat1, lon1, lat2, lon2) -> int:
-    R = 6371000
+    R = EARTH_RADIUS
     phi1, phi2 = map(math.radians, [lat1, lat2])
     delta_phi = math.radians(lat2 - lat1)
     delta_lambda = math.radians(lon2 - lon1)
@@ -16,6 +27,75 @@ def calculate_bearing(lat1, lon1, lat2, lon2) -> float:
     x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dLon)
     return (math.degrees(math.atan2(y, x)) + 360) % 360
 
+def bounding_box(lat: float, lon: float, radius: float) -> Tuple[float, float, float, float]:
+    """Прямоугольник, описанный вокруг круга radius (м): (lat_min, lon_min, lat_max, lon_max)."""
+    dlat = math.degrees(radius / EARTH_RADIUS)
+    dlon = math.degrees(radius / (EARTH_RADIUS * max(math.cos(math.radians(lat)), 1e-6)))
+    return (
+        max(lat - dlat, -90.0),
+        max(lon - dlon, -180.0),
+        min(lat + dlat, 90.0),
+        min(lon + dlon, 180.0),
+    )
+
+def batch_distance_bearing(
+    lat: float,
+    lon: float,
+    points: Sequence[Tuple[float, float]],
+) -> Tuple[List[int], List[float]]:
+    """
+    Расстояния (м) и азимуты (°) от точки до каждой из points одним проходом.
+    Те же формулы, что calculate_distance / calculate_bearing;
+    numpy — если установлен и батч достаточно большой.
+    """
+    if not points:
+        return [], []
+    if np is not None and len(points) >= NUMPY_MIN_BATCH:
+        return _batch_numpy(lat, lon, points)
+    return _batch_python(lat, lon, points)
+
+
+def _batch_numpy(lat, lon, points):
+    phi1 = math.radians(lat)
+    lam1 = math.radians(lon)
+    coords = np.radians(np.asarray(points, dtype=float))
+    phi2 = coords[:, 0]
+    d_lambda = coords[:, 1] - lam1
+    cos_phi2 = np.cos(phi2)
+
+    a = np.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * cos_phi2 * np.sin(d_lambda / 2) ** 2
+    dist = EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    y = np.sin(d_lambda) * cos_phi2
+    x = math.cos(phi1) * np.sin(phi2) - math.sin(phi1) * cos_phi2 * np.cos(d_lambda)
+    brg = (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+    return dist.astype(int).tolist(), brg.tolist()
+
+
+def _batch_python(lat, lon, points):
+    phi1 = math.radians(lat)
+    lam1 = math.radians(lon)
+    sin_phi1 = math.sin(phi1)
+    cos_phi1 = math.cos(phi1)
+    distances: List[int] = []
+    bearings: List[float] = []
+
+    for plat, plon in points:
+        phi2 = math.radians(plat)
+        d_lambda = math.radians(plon) - lam1
+        sin_phi2 = math.sin(phi2)
+        cos_phi2 = math.cos(phi2)
+
+        a = math.sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * cos_phi2 * math.sin(d_lambda / 2) ** 2
+        distances.append(int(EARTH_RADIUS * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))))
+
+        y = math.sin(d_lambda) * cos_phi2
+        x = cos_phi1 * sin_phi2 - sin_phi1 * cos_phi2 * math.cos(d_lambda)
+        bearings.append((math.degrees(math.atan2(y, x)) + 360) % 360)
+
+    return distances, bearings
+
 def bearing_to_direction(_, bearing: float) -> str:
     """Преобразует градусы в текстовое направление, используя переводчик."""
     val = int((bearing / 45) + 0.5)
@@ -24,3 +104,104 @@ def bearing_to_direction(_, bearing: float) -> str:
         "direction_south", "direction_southwest", "direction_west", "direction_northwest"
     ]
     return _(direction_keys[val % 8])
+
+
+# --- Geohash (тайлы для кэша поиска) ---
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Кодирует точку в geohash заданной длины."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # чётные биты — долгота
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str):
+    """Границы тайла geohash: (lat_min, lon_min, lat_max, lon_max)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+
+    for ch in geohash:
+        value = _GEOHASH_ALPHABET.index(ch)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def geohash_cells(lat: float, lon: float, radius: float, precision: int, inside: bool = False) -> List[str]:
+    """
+    Тайлы geohash длины precision, пересекающие круг radius (м) вокруг точки;
+    inside=True — только целиком лежащие в круге.
+    """
+    lat_min, lon_min, lat_max, lon_max = bounding_box(lat, lon, radius)
+    c_lat_min, c_lon_min, c_lat_max, c_lon_max = geohash_bounds(geohash_encode(lat_min, lon_min, precision))
+    height = c_lat_max - c_lat_min
+    width = c_lon_max - c_lon_min
+
+    cells = []
+    cell_lat = c_lat_min
+    while cell_lat < lat_max:
+        cell_lon = c_lon_min
+        while cell_lon < lon_max:
+            top, right = cell_lat + height, cell_lon + width
+            if inside:
+                # Самый дальний угол тайла
+                far_lat = cell_lat if abs(cell_lat - lat) > abs(top - lat) else top
+                far_lon = cell_lon if abs(cell_lon - lon) > abs(right - lon) else right
+                hit = calculate_distance(lat, lon, far_lat, far_lon) <= radius
+            else:
+                # Ближайшая к центру круга точка тайла
+                near_lat = min(max(lat, cell_lat), top)
+                near_lon = min(max(lon, cell_lon), right)
+                hit = calculate_distance(lat, lon, near_lat, near_lon) <= radius
+            if hit:
+                cells.append(geohash_encode(cell_lat + height / 2, cell_lon + width / 2, precision))
+            cell_lon = right
+        cell_lat += height
+    return cells
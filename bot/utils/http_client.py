@@ -0,0 +1,167 @@
+# bot/utils/http_client.py
+# -*- coding: utf-8 -*-
+"""
+Общий HTTP-слой для провайдеров мест (Foursquare / Mapbox / VietMap).
+
+Раньше каждый поиск создавал свежий httpx.AsyncClient на каждого провайдера,
+и каждый cache miss платил за новые TCP + TLS handshake к трём хостам.
+Теперь пулы соединений живут столько же, сколько бот:
+- создаётся в bot/main.py:main() и закрывается при остановке;
+- отдельный пул и keep-alive лимиты на хост каждого провайдера;
+- опциональный HTTP/2 (нужен пакет h2);
+- профили таймаутов на каждого провайдера.
+
+В хендлеры попадает через HttpMiddleware (как redis_conn через RedisMiddleware).
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from bot.utils.provider_health import CircuitOpenError, ProviderHealth
+from bot.utils.rate_limiter import ProviderQuota, QuotaExceededError
+
+# Профили таймаутов по провайдерам: connect / read / write / pool (секунды)
+DEFAULT_TIMEOUTS: Dict[str, httpx.Timeout] = {
+    "foursquare": httpx.Timeout(10.0, connect=3.0, pool=2.0),
+    "mapbox": httpx.Timeout(10.0, connect=3.0, pool=2.0),
+    "vietmap": httpx.Timeout(10.0, connect=3.0, pool=2.0),
+}
+
+# Таймаут для провайдеров без собственного профиля
+FALLBACK_TIMEOUT = httpx.Timeout(10.0)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ProviderHttp:
+    """
+    Пулы соединений к API провайдеров, общие для всех поисков.
+
+    Каждый провайдер ходит на свой хост, поэтому у каждого свой
+    httpx.AsyncClient: лимиты keep-alive получаются «на хост»,
+    и медленный провайдер не занимает соединения остальных.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeouts: Optional[Dict[str, httpx.Timeout]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        health: Optional[ProviderHealth] = None,
+        quota: Optional[ProviderQuota] = None,
+    ):
+        if http2 and not _http2_available():
+            logging.warning("HTTP/2 requested but 'h2' is not installed — falling back to HTTP/1.1")
+            http2 = False
+
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        # Лимиты действуют на каждый клиент, т.е. на каждый хост провайдера
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.transport = transport
+        self.health = health
+        self.quota = quota
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        """Клиент (пул соединений) провайдера; создаётся при первом запросе."""
+        client = self._clients.get(provider)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                http2=self.http2,
+                timeout=self.timeout(provider),
+                transport=self.transport,
+            )
+            self._clients[provider] = client
+        return client
+
+    def timeout(self, provider: str) -> httpx.Timeout:
+        """Профиль таймаутов провайдера."""
+        return self.timeouts.get(provider, FALLBACK_TIMEOUT)
+
+    async def get(self, provider: str, url: str, **kwargs) -> httpx.Response:
+        """
+        GET через пул провайдера с его профилем таймаутов.
+        Если подключён ProviderHealth — учитывает ошибки/латентность
+        и не отправляет запрос при разомкнутой цепи.
+        Если подключён ProviderQuota — списывает запрос из квоты провайдера;
+        цепь проверяется раньше, квоту тратят только реально отправленные запросы.
+        """
+        if self.health is not None and not await self.health.allow(provider):
+            raise CircuitOpenError(f"{provider} circuit is open")
+
+        if self.quota is not None:
+            try:
+                acquired = await self.quota.acquire(provider)
+            except BaseException:
+                acquired = False
+                raise
+            finally:
+                # Запрос не уйдёт — пробу half-open (если allow() её выдал) не держим
+                if not acquired and self.health is not None:
+                    await self.health.skip(provider)
+            if not acquired:
+                raise QuotaExceededError(f"{provider} quota exhausted")
+
+        if self.health is None:
+            return await self.client(provider).get(url, **kwargs)
+
+        started = time.monotonic()
+        try:
+            r = await self.client(provider).get(url, **kwargs)
+        except httpx.HTTPError:
+            await self.health.record(provider, False, time.monotonic() - started)
+            raise
+        except BaseException:
+            # Отмена (хеджирование, остановка) или чужая ошибка: пробу half-open
+            # нужно освободить, иначе цепь провайдера застрянет
+            await self.health.abort(provider)
+            raise
+        # 4xx (кроме 429) — ошибка запроса, а не провайдера
+        ok = r.status_code < 500 and r.status_code != 429
+        await self.health.record(provider, ok, time.monotonic() - started)
+        return r
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+async def provider_get(
+    http: Optional[ProviderHttp],
+    provider: str,
+    url: str,
+    **kwargs,
+) -> httpx.Response:
+    """
+    GET для провайдера: через общий пул, если он передан,
+    иначе — одноразовый клиент (скрипты, ручные вызовы).
+    """
+    if http is not None:
+        return await http.get(provider, url, **kwargs)
+
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUTS.get(provider, FALLBACK_TIMEOUT))
+    async with httpx.AsyncClient() as client:
+        return await client.get(url, **kwargs)
@@ -1,68 +1,143 @@
 # bot/utils/mapbox_api.py
 
+import asyncio
 import logging
-from typing import List, Dict, Any
+import math
+from typing import List, Dict, Any, Optional, Tuple
 
-import httpx
+from bot.utils import codec
+from bot.utils.geospatial import bounding_box, calculate_distance
+from bot.utils.http_client import ProviderHttp, provider_get
+from bot.utils.place import Place
+
+URL = "https://api.mapbox.com/geocoding/v5/mapbox.places/restaurant,cafe,bar.json"
+
+MAPBOX_MAX_LIMIT = 10      # предел limit у Geocoding v5
+POI_PER_KM2 = 40           # ожидаемая плотность заведений в городе — от неё limit
+SPLIT_MIN_RADIUS = 300     # круг меньше (м) на квадранты не делим
+
+BBox = Tuple[float, float, float, float]  # lat_min, lon_min, lat_max, lon_max
 
 
 async def find_places_mapbox(
     lat: float,
     lon: float,
     radius: int,
-    limit: int,
+    limit: Optional[int],
     lang_code: str,
     access_token: str,
-) -> List[Dict[str, Any]]:
-    """
-    Mapbox Geocoding API (POI search)
+    http: Optional[ProviderHttp] = None,
+) -> List[Place]:
     """
+    Mapbox Geocoding API (POI search) в пределах radius метров.
 
-    url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/restaurant,cafe,bar.json"
-
-    params = {
-        "proximity": f"{lon},{lat}",
-        "limit": limit,
+    - запрос ограничен bbox круга, proximity — только порядок выдачи;
+    - limit=None — по площади круга (POI_PER_KM2), не больше MAPBOX_MAX_LIMIT;
+    - места дальше radius отбрасываются до нормализации;
+    - ответ упёрся в limit, а в круг попала меньше чем половина — выдача
+      забита углами bbox, и круг дозапрашивается по квадрантам (4 запроса).
+    """
+    if limit is None:
+        limit = _limit_for(radius)
+    limit = min(limit, MAPBOX_MAX_LIMIT)
+    base = {
         "language": lang_code,
         "access_token": access_token,
     }
+    bbox = bounding_box(lat, lon, radius)
 
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, params=params, timeout=10.0)
+        features = await _fetch_bbox(http, base, bbox, limit, proximity=(lat, lon))
+        inside = _clip(features, lat, lon, radius)
 
-        if not r.is_success:
-            logging.error("Mapbox error: %s %s", r.status_code, r.text[:200])
-            return []
+        if len(features) >= limit and len(inside) * 2 < limit and radius >= SPLIT_MIN_RADIUS:
+            nested = await asyncio.gather(
+                *(_fetch_bbox(http, base, q, MAPBOX_MAX_LIMIT) for q in _quadrants(bbox)),
+                return_exceptions=True,
+            )
+            for sub in nested:
+                if isinstance(sub, Exception):
+                    logging.warning("Mapbox quadrant request failed: %s", sub)
+                    continue
+                inside.extend(_clip(sub, lat, lon, radius))
+    except Exception as e:
+        logging.error("Mapbox request failed: %s", e)
+        return []
 
-        data = r.json()
-        features = data.get("features", [])
+    seen = set()
+    places = []
+    for f in inside:
+        if f.get("id") in seen:
+            continue
+        seen.add(f.get("id"))
+        places.append(_normalize(f))
+    return places
 
-        return [_normalize(f) for f in features]
 
-    except Exception as e:
-        logging.error("Mapbox request failed: %s", e)
+def _limit_for(radius: float) -> int:
+    area_km2 = math.pi * (radius / 1000) ** 2
+    return max(1, min(MAPBOX_MAX_LIMIT, math.ceil(area_km2 * POI_PER_KM2)))
+
+
+def _clip(features: List[Dict[str, Any]], lat: float, lon: float, radius: float) -> List[Dict[str, Any]]:
+    """Сырые features в пределах radius — до нормализации."""
+    inside = []
+    for f in features:
+        coords = (f.get("geometry") or {}).get("coordinates") or [None, None]
+        if coords[0] is None or coords[1] is None:
+            continue
+        if calculate_distance(lat, lon, coords[1], coords[0]) <= radius:
+            inside.append(f)
+    return inside
+
+
+def _quadrants(bbox: BBox) -> List[BBox]:
+    lat_min, lon_min, lat_max, lon_max = bbox
+    lat_mid = (lat_min + lat_max) / 2
+    lon_mid = (lon_min + lon_max) / 2
+    return [
+        (lat_min, lon_min, lat_mid, lon_mid),
+        (lat_min, lon_mid, lat_mid, lon_max),
+        (lat_mid, lon_min, lat_max, lon_mid),
+        (lat_mid, lon_mid, lat_max, lon_max),
+    ]
+
+
+async def _fetch_bbox(
+    http: Optional[ProviderHttp],
+    base: Dict[str, Any],
+    bbox: BBox,
+    limit: int,
+    proximity: Optional[Tuple[float, float]] = None,
+) -> List[Dict[str, Any]]:
+    """Сырые features одного запроса в bbox (proximity по умолчанию — его центр)."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    p_lat, p_lon = proximity or ((lat_min + lat_max) / 2, (lon_min + lon_max) / 2)
+
+    params = {
+        **base,
+        "proximity": f"{p_lon},{p_lat}",
+        "bbox": f"{lon_min},{lat_min},{lon_max},{lat_max}",
+        "limit": limit,
+    }
+    r = await provider_get(http, "mapbox", URL, params=params)
+    if not r.is_success:
+        logging.error("Mapbox error: %s %s", r.status_code, r.text[:200])
         return []
+    return codec.json_loads(r.content).get("features", [])
 
 
-def _normalize(f: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize(f: Dict[str, Any]) -> Place:
     coords = f.get("geometry", {}).get("coordinates", [None, None])
+    place_type = f.get("place_type", [])
 
-    return {
-        "place_id": f.get("id"),
-        "name": f.get("text"),
-        "rating": None,  # Mapbox не даёт рейтинг
-        "user_ratings_total": 0,
-        "types": f.get("place_type", []),
-        "primary_type": f.get("place_type", ["poi"])[0],
-        "lat": coords[1],
-        "lon": coords[0],
-        "vicinity": f.get("place_name"),
-        "price_level": None,
-        "business_status": "OPERATIONAL",
-        "opening_hours": None,
-        "photos": [],
-        "icon": None,
-        "icon_background_color": None,
-        "permanently_closed": None,
-  }
+    # Mapbox не даёт рейтинг
+    return Place(
+        place_id=f.get("id"),
+        name=f.get("text"),
+        types=tuple(place_type),
+        primary_type=(place_type or ["poi"])[0],
+        lat=coords[1],
+        lon=coords[0],
+        vicinity=f.get("place_name"),
+    )
@@ -0,0 +1,180 @@
+# bot/utils/metrics.py
+# -*- coding: utf-8 -*-
+"""
+Поэтапные задержки поиска и эндпоинт метрик Prometheus.
+
+Отчёт Analytics знает только итоговую задержку поиска — не видно, где уходит
+время. Здесь каждый этап меряется отдельно:
+- search_stage_seconds{stage} — cache_read, catalogue, dedup, ranking,
+  cache_write, search (поиск в хендлере до выдачи), telegram_queue
+  (ожидание в OutboundScheduler) и telegram_send (сам запрос к Bot API);
+- provider_request_seconds{provider, role, outcome} — каждый вызов провайдера,
+  role = primary / fallback, outcome = ok / error / cancelled;
+- provider_candidates{provider} — сколько мест вернул провайдер;
+- search_cache_total{outcome} — исходы кэша поиска (как CACHE_STATS).
+
+Метрики отдаются на METRICS_PORT (GET /metrics), сервер поднимает bot/main.py.
+
+Трассировка (TRACE_SPANS): поиск получает correlation id (@metrics.traced),
+каждый этап пишет в лог строку «trace=<id> span=<этап> <мс>» — по id видно
+раскладку одного медленного поиска. id наследуют задачи провайдеров
+(contextvars копируются в asyncio-задачи).
+
+prometheus_client необязателен: без него метрики не собираются,
+эндпоинт не поднимается, трассировка в лог работает.
+"""
+
+import contextvars
+import functools
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from aiohttp import web
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+except ImportError:  # prometheus_client необязателен — метрики отключаются
+    Counter = Histogram = None
+
+METRICS_PATH = "/metrics"
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+CANDIDATE_BUCKETS = (0, 1, 3, 5, 10, 20, 30, 50, 100)
+
+STAGE_SEARCH = "search"
+STAGE_CACHE_READ = "cache_read"
+STAGE_CATALOGUE = "catalogue"
+STAGE_DEDUP = "dedup"
+STAGE_RANKING = "ranking"
+STAGE_CACHE_WRITE = "cache_write"
+STAGE_TELEGRAM_QUEUE = "telegram_queue"
+STAGE_TELEGRAM_SEND = "telegram_send"
+
+# Включается из bot/main.py (TRACE_SPANS)
+trace_spans = False
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+
+class _NoopMetric:
+    """Заглушка метрики без prometheus_client."""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+
+if Histogram is not None:
+    SEARCH_STAGE_SECONDS = Histogram(
+        "search_stage_seconds", "Длительность этапа поиска", ["stage"], buckets=STAGE_BUCKETS,
+    )
+    PROVIDER_REQUEST_SECONDS = Histogram(
+        "provider_request_seconds", "Длительность вызова провайдера мест",
+        ["provider", "role", "outcome"], buckets=STAGE_BUCKETS,
+    )
+    PROVIDER_CANDIDATES = Histogram(
+        "provider_candidates", "Мест в ответе провайдера", ["provider"], buckets=CANDIDATE_BUCKETS,
+    )
+    SEARCH_CACHE_TOTAL = Counter(
+        "search_cache_total", "Исходы кэша поиска", ["outcome"],
+    )
+else:
+    SEARCH_STAGE_SECONDS = PROVIDER_REQUEST_SECONDS = PROVIDER_CANDIDATES = SEARCH_CACHE_TOTAL = _NoopMetric()
+
+
+# --- Трассировка ---
+
+@contextmanager
+def trace() -> Iterator[str]:
+    """Correlation id для поиска внутри блока (и задач, созданных в нём)."""
+    trace_id = uuid.uuid4().hex[:12]
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def traced(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Декоратор корутины: каждый вызов — со своим correlation id."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with trace():
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def current_trace() -> Optional[str]:
+    return _trace_id.get()
+
+
+def _log_span(name: str, seconds: float, detail: str = "") -> None:
+    trace_id = _trace_id.get()
+    if trace_spans and trace_id is not None:
+        logging.info("trace=%s span=%s %.1fms%s", trace_id, name, seconds * 1000, detail)
+
+
+# --- Этапы ---
+
+def observe_stage(name: str, seconds: float) -> None:
+    SEARCH_STAGE_SECONDS.labels(name).observe(seconds)
+    _log_span(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Замеряет блок как этап поиска: with metrics.stage(metrics.STAGE_RANKING): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_provider(
+    provider: str,
+    fallback: bool,
+    outcome: str,
+    seconds: float,
+    candidates: Optional[int] = None,
+) -> None:
+    role = "fallback" if fallback else "primary"
+    PROVIDER_REQUEST_SECONDS.labels(provider, role, outcome).observe(seconds)
+    if candidates is not None:
+        PROVIDER_CANDIDATES.labels(provider).observe(candidates)
+    detail = f" {role} {outcome}" + (f" {candidates} places" if candidates is not None else "")
+    _log_span(f"provider:{provider}", seconds, detail)
+
+
+def count_cache(outcome: str) -> None:
+    SEARCH_CACHE_TOTAL.labels(outcome).inc()
+
+
+# --- HTTP-эндпоинт ---
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    body = generate_latest()
+    return web.Response(body=body, headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+async def start_server(host: str, port: int) -> Optional[web.AppRunner]:
+    """GET /metrics на host:port; None — prometheus_client не установлен."""
+    if Histogram is None:
+        logging.warning("prometheus_client is not installed: metrics endpoint disabled")
+        return None
+
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, _metrics_handler)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info("Metrics on %s:%d%s", host, port, METRICS_PATH)
+    return runner
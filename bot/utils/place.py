@@ -0,0 +1,84 @@
+# bot/utils/place.py
+# -*- coding: utf-8 -*-
+"""
+Единая модель места для всех провайдеров.
+
+Раньше каждый провайдер собирал dict из 16 ключей, половина которых —
+константные заглушки (photos: [], icon: None, business_status: "OPERATIONAL"…),
+и эти dict-ы копировались через merge, dedup, сортировку и JSON-кэш.
+Place — frozen dataclass со __slots__:
+- в объекте только реально различающиеся поля;
+- необязательные поля имеют значения по умолчанию,
+  константы прежней схемы — атрибуты класса;
+- to_dict / from_dict — компактный JSON для кэша и каталога
+  (from_dict понимает и старые 16-ключевые dict-ы).
+"""
+
+from dataclasses import dataclass, fields, replace
+from typing import Any, ClassVar, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True, slots=True)
+class Place:
+    place_id: Optional[str]
+    name: Optional[str]
+    lat: Optional[float]
+    lon: Optional[float]
+    rating: Optional[float] = None          # шкала 0–5
+    user_ratings_total: int = 0
+    types: Tuple[str, ...] = ()
+    primary_type: Optional[str] = None
+    vicinity: Optional[str] = None
+    price_level: Optional[int] = None
+    open_now: Optional[bool] = None
+    # Геометрия относительно пользователя — заполняет places_service
+    distance: Optional[int] = None
+    bearing: Optional[float] = None
+
+    # Константы прежней схемы — одни на класс, а не в каждом объекте
+    business_status: ClassVar[str] = "OPERATIONAL"
+    photos: ClassVar[Tuple[Any, ...]] = ()
+    icon: ClassVar[Optional[str]] = None
+    icon_background_color: ClassVar[Optional[str]] = None
+    permanently_closed: ClassVar[Optional[bool]] = None
+
+    @property
+    def located(self) -> bool:
+        return self.lat is not None and self.lon is not None
+
+    def with_geometry(self, distance: int, bearing: float) -> "Place":
+        """Копия места с расстоянием и азимутом от пользователя."""
+        return replace(self, distance=distance, bearing=bearing)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Компактный dict для JSON: только поля, отличные от значений по умолчанию."""
+        data = {}
+        for name in _FIELD_NAMES:
+            value = getattr(self, name)
+            if value != _FIELD_DEFAULTS.get(name, ...):
+                data[name] = list(value) if name == "types" else value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Place":
+        """Место из to_dict() или из старого 16-ключевого dict-а провайдера."""
+        hours = data.get("opening_hours")
+        return cls(
+            place_id=data.get("place_id"),
+            name=data.get("name"),
+            lat=data.get("lat"),
+            lon=data.get("lon"),
+            rating=data.get("rating"),
+            user_ratings_total=data.get("user_ratings_total") or 0,
+            types=tuple(data.get("types") or ()),
+            primary_type=data.get("primary_type"),
+            vicinity=data.get("vicinity"),
+            price_level=data.get("price_level"),
+            open_now=data.get("open_now", (hours or {}).get("open_now")),
+            distance=data.get("distance"),
+            bearing=data.get("bearing"),
+        )
+
+
+_FIELD_NAMES = tuple(f.name for f in fields(Place))
+_FIELD_DEFAULTS = {f.name: f.default for f in fields(Place)}
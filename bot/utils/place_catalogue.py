@@ -0,0 +1,183 @@
+# bot/utils/place_catalogue.py
+# -*- coding: utf-8 -*-
+"""
+Постоянный пространственный каталог мест в Redis.
+
+Раньше всё, что вернули провайдеры, выбрасывалось через 10 минут вместе с кэшем.
+Теперь каждый загруженный набор кандидатов сливается в каталог:
+- позиции — Redis GEO (GEOADD catalogue:geo, member = place_id);
+- атрибуты — компактный JSON в hash catalogue:places (Place.to_dict)
+  со своей меткой свежести "ts";
+- покрытие — что провайдеры уже опрашивали, живёт CATALOGUE_FRESH:
+  catalogue:fetched:tile:{bucket}:{geohash} — круг запроса этого тайла кэша,
+  catalogue:fetched:{precision}:{geohash} — ячейки geohash, целиком
+  попавшие в опрошенный круг (так круг покрывают и соседние загрузки).
+
+Запрос — проверка покрытия + GEOSEARCH BYRADIUS + HMGET одним Lua-скриптом,
+т.е. один вызов Redis. Каталог отвечает, только если круг запроса недавно
+опрошен сам или каждая задевающая его ячейка покрыта, и в круге не меньше
+CATALOGUE_MIN_PLACES свежих мест; отдаются только свежие места.
+Иначе зовём провайдеров: соседний тайл, опрошенный лишь частично,
+не должен навсегда остаться без мест у своего края.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from bot.utils import codec
+from bot.utils.geospatial import geohash_cells
+from bot.utils.place import Place
+
+GEO_KEY = "catalogue:geo"
+ATTRS_KEY = "catalogue:places"
+FETCHED_TILE_KEY = "catalogue:fetched:tile:{tile}"
+FETCHED_CELL_KEY = "catalogue:fetched:{precision}:{cell}"
+
+CATALOGUE_FRESH = 6 * 3600         # место и покрытие тайла считаются свежими 6 часов
+CATALOGUE_MAX_AGE = 30 * 24 * 3600  # старше — удаляется из каталога при чтении
+CATALOGUE_MIN_PLACES = 10          # меньше свежих мест в радиусе — каталог «тонкий»
+CATALOGUE_MAX_RESULTS = 200
+
+# KEYS: geo, attrs, покрытие тайла, покрытие ячеек...
+# Не хватает покрытия — false; иначе плоский список
+# [member, attrs, member, attrs, ...] по возрастанию расстояния
+_QUERY_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    for i = 4, #KEYS do
+        if redis.call('EXISTS', KEYS[i]) == 0 then
+            return false
+        end
+    end
+end
+local members = redis.call('GEOSEARCH', KEYS[1], 'FROMLONLAT', ARGV[1], ARGV[2],
+                           'BYRADIUS', ARGV[3], 'm', 'ASC', 'COUNT', ARGV[4])
+if #members == 0 then
+    return {}
+end
+local attrs = redis.call('HMGET', KEYS[2], unpack(members))
+local out = {}
+for i, member in ipairs(members) do
+    out[#out + 1] = member
+    out[#out + 1] = attrs[i]
+end
+return out
+"""
+
+# Script регистрируется один раз; вызывается с client= текущего соединения
+_query_script = None
+
+
+class Area(NamedTuple):
+    """Круг запроса тайла кэша поиска (places_service._tile_query)."""
+
+    tile: str        # "{bucket}:{geohash}"
+    lat: float
+    lon: float
+    radius: float
+    precision: int
+
+
+def _cell_keys(area: Area, inside: bool) -> List[str]:
+    return [
+        FETCHED_CELL_KEY.format(precision=area.precision, cell=cell)
+        for cell in geohash_cells(area.lat, area.lon, area.radius, area.precision, inside=inside)
+    ]
+
+
+def _compact(place: Place, ts: float) -> bytes:
+    data = place.to_dict()
+    data["ts"] = ts
+    return codec.json_dumps(data)
+
+
+async def upsert(
+    redis_conn,
+    places: List[Place],
+    fetched: Optional[Area] = None,
+) -> None:
+    """
+    Сливает кандидатов в каталог: GEOADD + HSET одним pipeline.
+    fetched — круг полного ответа провайдеров: он и ячейки целиком
+    внутри него отмечаются опрошенными.
+    """
+    now = time.time()
+    positions: List[Any] = []
+    attrs: Dict[str, bytes] = {}
+
+    for p in places:
+        if not p.place_id or not p.located:
+            continue
+        positions.extend((float(p.lon), float(p.lat), p.place_id))
+        attrs[p.place_id] = _compact(p, now)
+
+    if not attrs and fetched is None:
+        return
+
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        if attrs:
+            pipe.geoadd(GEO_KEY, positions)
+            pipe.hset(ATTRS_KEY, mapping=attrs)
+        if fetched is not None:
+            # Пустой ответ — тоже знание: мест тут действительно нет
+            for key in [FETCHED_TILE_KEY.format(tile=fetched.tile), *_cell_keys(fetched, inside=True)]:
+                pipe.set(key, int(now), ex=CATALOGUE_FRESH)
+        await pipe.execute()
+    except Exception as e:
+        logging.warning("Catalogue upsert failed: %s", e)
+
+
+async def query(redis_conn, area: Area) -> Optional[List[Place]]:
+    """
+    Свежие места каталога в круге area (ближайшие первыми).
+    None — круг опрошен не весь или давно, либо каталог тонкий: нужны провайдеры.
+    """
+    global _query_script
+    if _query_script is None:
+        _query_script = redis_conn.register_script(_QUERY_LUA)
+
+    try:
+        flat = await _query_script(
+            keys=[
+                GEO_KEY, ATTRS_KEY,
+                FETCHED_TILE_KEY.format(tile=area.tile), *_cell_keys(area, inside=False),
+            ],
+            args=[area.lon, area.lat, area.radius, CATALOGUE_MAX_RESULTS],
+            client=redis_conn,
+        )
+    except Exception as e:
+        logging.warning("Catalogue query failed: %s", e)
+        return None
+    if not flat:
+        return None  # не опрошено (false) или пусто
+
+    now = time.time()
+    places: List[Place] = []
+    expired: List[str] = []
+
+    for member, payload in zip(flat[::2], flat[1::2]):
+        if payload is None:
+            expired.append(member)
+            continue
+        data = codec.json_loads(payload)
+        age = now - data.pop("ts", 0)
+        if age > CATALOGUE_MAX_AGE:
+            expired.append(member)
+            continue
+        if age <= CATALOGUE_FRESH:
+            # Устаревшие не отдаём: провайдеры их давно не возвращали
+            places.append(Place.from_dict(data))
+
+    if expired:
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.zrem(GEO_KEY, *expired)
+            pipe.hdel(ATTRS_KEY, *expired)
+            await pipe.execute()
+        except Exception as e:
+            logging.warning("Catalogue cleanup failed: %s", e)
+
+    if len(places) < CATALOGUE_MIN_PLACES:
+        return None
+    return places
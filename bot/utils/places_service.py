@@ -1,61 +1,387 @@
 # bot/utils/places_service.py
 
 import asyncio
-import json
-import hashlib
-from typing import List, Dict, Any
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable, AsyncIterator
 import logging
 
+from bot.utils import codec, metrics, place_catalogue
+from bot.utils.entity_resolution import PlaceResolver, resolve
 from bot.utils.foursquare_api import find_places as fsq_find
 from bot.utils.mapbox_api import find_places_mapbox
 from bot.utils.vietmap_api import find_places_vietmap
-from bot.utils.geospatial import calculate_distance
+from bot.utils.geospatial import (
+    batch_distance_bearing,
+    calculate_distance,
+    geohash_bounds,
+    geohash_encode,
+)
+from bot.utils.http_client import ProviderHttp
+from bot.utils.place import Place
+from bot.utils.provider_scheduler import ProviderScheduler
+from bot.utils.rate_limiter import (
+    PRIORITY_BACKGROUND,
+    QuotaExceededError,
+    request_priority,
+)
+
+
+CACHE_TTL = 600  # 10 минут — запись свежая
+STALE_TTL = 300  # ещё 5 минут отдаём устаревшую запись, обновляя её в фоне
+PARTIAL_TTL = 60  # неполный набор (сработал дедлайн поиска) свеж только минуту
+
+# Межрепличная блокировка обновления тайла
+LOCK_TTL_MS = 15_000
+LOCK_WAIT = 5.0    # сколько ждём результат чужой реплики, секунды
+LOCK_POLL = 0.1
+
+_RELEASE_LOCK_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# L1: декодированные тайлы в памяти процесса перед Redis
+L1_MAX_ENTRIES = 2048
+L1_MAX_BYTES = 32 * 1024 * 1024  # по оценке памяти декодированных Place (L1_PLACE_BYTES)
+# Память одного декодированного Place со строками и кортежами (sys.getsizeof
+# вглубь для типичного места FSQ/Mapbox ≈ 500 байт). Записи в Redis сжаты
+# msgpack+zlib в разы сильнее — их длина память L1 не ограничивает
+L1_PLACE_BYTES = 512
+L1_ENTRY_BYTES = 256             # ключ, список, кортеж записи
+L1_INVALIDATION_CHANNEL = "places:invalidate"
+L1_RECONNECT_DELAY = 1.0       # пауза перед переподпиской, секунды; растёт вдвое
+L1_RECONNECT_MAX_DELAY = 30.0
+
+# Счётчики кэша: l1_hit / hit / miss / stale / catalogue_hit /
+# coalesced_local / coalesced_remote / refresh
+CACHE_STATS: Counter = Counter()
+
+# Идентификатор процесса в сообщениях инвалидации — свои сообщения пропускаем
+_INSTANCE_ID = uuid.uuid4().hex
+
+# Загрузка кандидатов тайла: (кандидаты, complete)
+TileFetcher = Callable[[], Awaitable[Tuple[List[Place], bool]]]
+
+# Single-flight: тайл → задача, которая его сейчас загружает
+# (заодно держит ссылку на фоновые обновления, чтобы их не собрал GC)
+_inflight: Dict[str, asyncio.Task] = {}
+
+# Сколько мест нужно, чтобы не включать fallback-и
+MIN_RESULTS = 3
+
+# Тайловый кэш: (радиус-бакет в метрах, точность geohash).
+# В тайле хранится нормализованный НЕфильтрованный набор кандидатов,
+# собранный вокруг центра тайла с запасом на полудиагональ тайла —
+# поэтому им можно ответить для любой точки внутри тайла и любого
+# радиуса <= бакета. Рейтинг, точный радиус и ранжирование — на чтении.
+TILE_BUCKETS: Tuple[Tuple[int, int], ...] = (
+    (200, 7),    # тайл ~153×153 м
+    (500, 7),
+    (1000, 6),   # тайл ~1.2×0.6 км
+    (2000, 6),
+    (5000, 6),
+)
+
+
+def _tile_buckets(radius: int) -> List[Tuple[int, int]]:
+    """Бакеты, которые покрывают радиус, от меньшего к большему."""
+    buckets = [(b, prec) for b, prec in TILE_BUCKETS if b >= radius]
+    return buckets or [(int(radius), 5)]
+
+
+def _make_tile_key(lat: float, lon: float, bucket: int, precision: int) -> str:
+    return f"places:tile:{bucket}:{geohash_encode(lat, lon, precision)}"
+
+
+def _tile_query(lat: float, lon: float, bucket: int, precision: int) -> Tuple[float, float, int]:
+    """
+    Центр тайла и радиус запроса к провайдерам,
+    покрывающий круг радиуса bucket вокруг любой точки тайла.
+    """
+    lat_min, lon_min, lat_max, lon_max = geohash_bounds(geohash_encode(lat, lon, precision))
+    center_lat = (lat_min + lat_max) / 2
+    center_lon = (lon_min + lon_max) / 2
+    half_diagonal = calculate_distance(center_lat, center_lon, lat_max, lon_max)
+    return center_lat, center_lon, bucket + half_diagonal + 1
 
 
-CACHE_TTL = 600  # 10 минут
+class L1Cache:
+    """
+    LRU/TTL-кэш уже декодированных тайлов.
+    Срок жизни записи совпадает с Redis (CACHE_TTL + STALE_TTL от метки ts),
+    поэтому свежесть/устаревание считаются так же, как для Redis-записи.
+    Предел max_bytes — по оценке памяти декодированных мест (estimate).
+    """
 
+    def __init__(self, max_entries: int = L1_MAX_ENTRIES, max_bytes: int = L1_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[str, Tuple[List[Place], float, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Tuple[List[Place], float]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        places, ts, _size = item
+        if time.time() - ts >= CACHE_TTL + STALE_TTL:
+            self.invalidate(key)
+            return None
+        self._data.move_to_end(key)
+        return places, ts
+
+    @staticmethod
+    def estimate(places: List[Place]) -> int:
+        """Оценка памяти записи: L1_ENTRY_BYTES + L1_PLACE_BYTES на место."""
+        return L1_ENTRY_BYTES + L1_PLACE_BYTES * len(places)
+
+    def put(self, key: str, places: List[Place], ts: float) -> None:
+        size = self.estimate(places)
+        if size > self.max_bytes:
+            return
+        self.invalidate(key)
+        self._data[key] = (places, ts, size)
+        self.bytes += size
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            _key, (_places, _ts, old_size) = self._data.popitem(last=False)
+            self.bytes -= old_size
+
+    def invalidate(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.bytes -= item[2]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+
+_l1 = L1Cache()
+
+
+async def listen_l1_invalidations(redis_conn) -> None:
+    """
+    Подписка на инвалидации L1 от других реплик (Redis pub/sub).
+    Запускается фоновой задачей из bot/main.py.
+    Обрыв подписки не останавливает задачу: переподписка с backoff,
+    после каждой подписки L1 сбрасывается — пропущенные инвалидации не узнать.
+    """
+    delay = L1_RECONNECT_DELAY
+    while True:
+        pubsub = redis_conn.pubsub()
+        try:
+            await pubsub.subscribe(L1_INVALIDATION_CHANNEL)
+            _l1.clear()
+            delay = L1_RECONNECT_DELAY
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                sender, _sep, key = str(message["data"]).partition(":")
+                if sender != _INSTANCE_ID:
+                    _l1.invalidate(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning("L1 invalidation subscription lost: %s", e)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, L1_RECONNECT_MAX_DELAY)
+
+
+def _count_cache(outcome: str) -> None:
+    CACHE_STATS[outcome] += 1
+    metrics.count_cache(outcome)
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """Снимок счётчиков кэша поиска."""
+    return dict(CACHE_STATS)
+
+
+def _encode_entry(places: List[Place], ts: float) -> bytes:
+    return codec.pack({"ts": ts, "places": [p.to_dict() for p in places]})
+
+
+def _decode_entry(payload: bytes) -> Optional[Tuple[List[Place], float]]:
+    """
+    Кандидаты тайла и метка времени загрузки; None — запись другой схемы
+    или битая (обрезанная, не распаковывается) — читается как промах.
+    """
+    try:
+        data = codec.unpack(payload)
+        if isinstance(data, list):
+            # Старый формат без метки времени — считаем устаревшим
+            return [Place.from_dict(p) for p in data], time.time() - CACHE_TTL
+        return [Place.from_dict(p) for p in data["places"]], float(data["ts"])
+    except codec.SchemaMismatch as e:
+        logging.info("Cache entry skipped: %s", e)
+        return None
+    except Exception as e:
+        # zlib.error, ошибки msgpack/orjson, ValueError, KeyError, TypeError
+        logging.warning("Corrupt cache entry skipped: %s: %s", type(e).__name__, e)
+        return None
 
-def _make_cache_key(
-    lat: float,
-    lon: float,
-    radius: int,
-    min_rating: float,
-    max_rating: float,
-) -> str:
-    raw = f"{round(lat,4)}:{round(lon,4)}:{radius}:{min_rating}:{max_rating}"
-    h = hashlib.md5(raw.encode()).hexdigest()
-    return f"places:{h}"
+
+async def _store_tile(
+    redis_conn,
+    key: str,
+    places: List[Place],
+    complete: bool = True,
+) -> None:
+    ts = time.time()
+    if not complete:
+        # Неполный набор помечаем «старше», чтобы он раньше ушёл на обновление
+        ts -= CACHE_TTL - PARTIAL_TTL
+    with metrics.stage(metrics.STAGE_CACHE_WRITE):
+        payload = _encode_entry(places, ts)
+        _l1.put(key, places, ts)
+        try:
+            pipe = codec.binary_client(redis_conn).pipeline(transaction=False)
+            pipe.setex(key, CACHE_TTL + STALE_TTL, payload)
+            pipe.publish(L1_INVALIDATION_CHANNEL, f"{_INSTANCE_ID}:{key}")
+            await pipe.execute()
+        except Exception as e:
+            logging.warning("Cache write failed: %s", e)
+
+
+async def _wait_for_tile(redis_conn, key: str, since: float) -> Optional[List[Place]]:
+    """Ждём, пока другая реплика запишет тайл не старее since."""
+    cache = codec.binary_client(redis_conn)
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL)
+        try:
+            payload = await cache.get(key)
+        except Exception as e:
+            logging.warning("Cache read failed: %s", e)
+            return None
+        entry = _decode_entry(payload) if payload else None
+        if entry is not None:
+            places, ts = entry
+            if ts >= since:
+                _l1.put(key, places, ts)
+                return places
+    return None
+
+
+async def _load_tile(
+    redis_conn,
+    key: str,
+    fetch: TileFetcher,
+) -> List[Place]:
+    """
+    Загрузка тайла у провайдеров под короткой Redis-блокировкой.
+    Если тайл уже грузит другая реплика — ждём её результат.
+    """
+    started = time.time()
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+
+    try:
+        acquired = await redis_conn.set(lock_key, token, nx=True, px=LOCK_TTL_MS)
+    except Exception as e:
+        logging.warning("Cache lock failed: %s", e)
+        acquired = True  # Redis недоступен — просто идём к провайдерам
+        token = None
+
+    if not acquired:
+        _count_cache("coalesced_remote")
+        places = await _wait_for_tile(redis_conn, key, started)
+        if places is not None:
+            return places
+        logging.info("Cache lock holder is late → querying providers")
+
+    try:
+        places, complete = await fetch()
+        await _store_tile(redis_conn, key, places, complete)
+        return places
+    finally:
+        if acquired and token:
+            try:
+                await redis_conn.eval(_RELEASE_LOCK_LUA, 1, lock_key, token)
+            except Exception as e:
+                logging.warning("Cache unlock failed: %s", e)
+
+
+def _start_load(
+    redis_conn,
+    key: str,
+    fetch: TileFetcher,
+) -> asyncio.Task:
+    """Задача загрузки тайла; если она уже идёт в процессе — та же самая."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_tile(redis_conn, key, fetch))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    else:
+        _count_cache("coalesced_local")
+    return task
+
+
+async def _single_flight(
+    redis_conn,
+    key: str,
+    fetch: TileFetcher,
+) -> List[Place]:
+    """
+    Одинаковые одновременные загрузки тайла внутри процесса
+    садятся на одну задачу. shield — отмена одного ожидающего
+    не отменяет загрузку для остальных.
+    """
+    return await asyncio.shield(_start_load(redis_conn, key, fetch))
 
 
-def _deduplicate(places: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    seen = set()
-    result = []
+def _log_refresh_result(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning("Background refresh failed: %s", task.exception())
 
-    for p in places:
-        key = (p.get("name"), p.get("lat"), p.get("lon"))
-        if key not in seen:
-            seen.add(key)
-            result.append(p)
 
-    return result
+def _schedule_refresh(
+    redis_conn,
+    key: str,
+    fetch: TileFetcher,
+) -> None:
+    """Фоновое обновление устаревшего тайла (не больше одного на тайл)."""
+    if key in _inflight:
+        return
+    _count_cache("refresh")
+    # Фоновый приоритет: не трогает резерв квот провайдеров (задача копирует контекст)
+    token = request_priority.set(PRIORITY_BACKGROUND)
+    try:
+        task = _start_load(redis_conn, key, fetch)
+    finally:
+        request_priority.reset(token)
+    task.add_done_callback(_log_refresh_result)
 
 
-def _score(place: Dict[str, Any], user_lat: float, user_lon: float) -> float:
+def _score(place: Place, user_lat: float, user_lon: float) -> float:
     """
     Ranking:
     - приоритет рейтинга (FSQ)
-    - затем расстояние
+    - затем расстояние (берётся из place.distance, если уже посчитано)
     """
 
-    rating = float(place.get("rating") or 0.0)
-
-    lat = place.get("lat")
-    lon = place.get("lon")
+    rating = float(place.rating or 0.0)
 
-    if lat is None or lon is None:
-        return rating
+    distance = place.distance
+    if distance is None:
+        if not place.located:
+            return rating
 
-    distance = calculate_distance(user_lat, user_lon, float(lat), float(lon))
+        distance = calculate_distance(user_lat, user_lon, float(place.lat), float(place.lon))
 
     # чем ближе — тем выше score
     distance_score = 1 / (1 + distance)
@@ -63,6 +389,93 @@ def _score(place: Dict[str, Any], user_lat: float, user_lon: float) -> float:
     return 0.7 * rating + 0.3 * distance_score
 
 
+def _in_rating_range(place: Place, min_rating: float, max_rating: float) -> bool:
+    if place.rating is None:
+        return True  # Mapbox / VietMap без рейтинга не отсекаем
+    return float(min_rating) <= float(place.rating) <= float(max_rating)
+
+
+def _select(
+    candidates: List[Place],
+    lat: float,
+    lon: float,
+    radius: int,
+    min_rating: float,
+    max_rating: float,
+) -> List[Place]:
+    """
+    Из набора кандидатов тайла: точный радиус → диапазон рейтинга → ранжирование.
+    Если в диапазон попало меньше MIN_RESULTS — фильтр рейтинга снимается
+    (как раньше расширенный запрос к FSQ).
+
+    Расстояние и азимут считаются один раз для всех кандидатов
+    (batch_distance_bearing) и кладутся в копии отобранных мест —
+    их переиспользуют ранжирование и карточки. Кэшированные Place не меняются.
+    """
+    with metrics.stage(metrics.STAGE_RANKING):
+        located = [p for p in candidates if p.located]
+        distances, bearings = batch_distance_bearing(
+            lat, lon, [(float(p.lat), float(p.lon)) for p in located],
+        )
+        nearby = [
+            p.with_geometry(dist, brg)
+            for p, dist, brg in zip(located, distances, bearings)
+            if dist <= radius
+        ]
+
+        selected = [p for p in nearby if _in_rating_range(p, min_rating, max_rating)]
+        if len(selected) < MIN_RESULTS:
+            logging.info("Fallback: rating filter relaxed")
+            selected = nearby
+
+        return sorted(
+            selected,
+            key=lambda p: _score(p, lat, lon),
+            reverse=True,
+        )
+
+
+def _progress_callback(
+    progress: Callable[[List[Place]], None],
+    lat: float,
+    lon: float,
+    radius: int,
+    min_rating: float,
+    max_rating: float,
+) -> Callable[[List[Place]], None]:
+    """on_update для ProviderScheduler: слитые кандидаты → ранжированный список в progress."""
+    def on_update(merged: List[Place]) -> None:
+        progress(_select(merged, lat, lon, radius, min_rating, max_rating))
+    return on_update
+
+
+async def _read_cached_tile(
+    redis_conn,
+    tile_keys: List[str],
+    buckets: List[Tuple[int, int]],
+) -> Optional[Tuple[str, Tuple[int, int], List[Place], float]]:
+    """Первый найденный тайл: (ключ, бакет, кандидаты, метка времени) или None."""
+    for key, tile in zip(tile_keys, buckets):
+        local = _l1.get(key)
+        if local is not None:
+            _count_cache("l1_hit")
+            return (key, tile, *local)
+
+    try:
+        cached = await codec.binary_client(redis_conn).mget(tile_keys)
+    except Exception as e:
+        logging.warning("Cache read failed: %s", e)
+        return None
+
+    for key, tile, payload in zip(tile_keys, buckets, cached):
+        decoded = _decode_entry(payload) if payload else None
+        if decoded is not None:
+            places, ts = decoded
+            _l1.put(key, places, ts)
+            return key, tile, places, ts
+    return None
+
+
 async def search_places(
     _,
     lat: float,
@@ -75,63 +488,126 @@ async def search_places(
     mapbox_token: str,
     vietmap_api_key: str,
     redis_conn,
-) -> List[Dict[str, Any]]:
+    http: Optional[ProviderHttp] = None,
+    progress: Optional[Callable[[List[Place]], None]] = None,
+) -> List[Place]:
     """
     Production Places Orchestrator
 
     Flow:
-    1. Cache
-    2. Mapbox + Foursquare (parallel)
-    3. Merge + deduplicate
-    4. Fallback (FSQ → VietMap)
-    5. Ranking
-    6. Cache write
+    1. Tile cache: L1 в памяти → Redis (любой бакет >= radius); устаревшая запись
+       отдаётся сразу и обновляется в фоне (stale-while-revalidate)
+    2. Single-flight: одна загрузка тайла на процесс и на все реплики
+       Постоянный каталог (Redis GEO) — если все тайлы вокруг недавно опрошены
+       и мест достаточно, провайдеры не вызываются
+    3. Mapbox + Foursquare (parallel, без фильтра рейтинга)
+       + VietMap спекулятивно, всё в общем бюджете времени
+    4. Merge + deduplicate
+    5. Cache write (весь набор кандидатов тайла; неполный — на PARTIAL_TTL)
+       + upsert в каталог
+    6. Radius clip + rating filter + ranking (in-process)
+
+    http — общий пул соединений к провайдерам (из HttpMiddleware).
+    progress — получает промежуточный ранжированный список, пока провайдеры
+    ещё отвечают (только при загрузке у провайдеров; см. search_places_stream).
     """
 
-    cache_key = _make_cache_key(lat, lon, radius, min_rating, max_rating)
+    buckets = _tile_buckets(radius)
+    tile_keys = [_make_tile_key(lat, lon, b, prec) for b, prec in buckets]
 
-    # 🔹 1. CACHE READ
-    try:
-        cached = await redis_conn.get(cache_key)
-        if cached:
-            logging.info("CACHE HIT")
-            return json.loads(cached)
-    except Exception as e:
-        logging.warning("Cache read failed: %s", e)
+    def tile_fetcher(bucket: int, precision: int, with_progress: bool = False) -> TileFetcher:
+        q_lat, q_lon, q_radius = _tile_query(lat, lon, bucket, precision)
+        area = place_catalogue.Area(
+            f"{bucket}:{geohash_encode(lat, lon, precision)}", q_lat, q_lon, q_radius, precision,
+        )
 
-    logging.info("CACHE MISS → querying providers")
+        on_update = (
+            _progress_callback(progress, lat, lon, radius, min_rating, max_rating)
+            if with_progress and progress is not None else None
+        )
 
-    # 🔹 2. PROVIDERS (parallel)
-    mapbox_task = find_places_mapbox(
-        lat=lat,
-        lon=lon,
-        radius=radius,
-        limit=30,
-        lang_code=lang_code,
-        access_token=mapbox_token,
-    )
+        async def fetch() -> Tuple[List[Place], bool]:
+            # Сначала постоянный каталог; провайдеры — только если он устарел/тонкий
+            with metrics.stage(metrics.STAGE_CATALOGUE):
+                places = await place_catalogue.query(redis_conn, area)
+            if places is not None:
+                # В каталоге могут лежать копии одного места от разных провайдеров
+                places = resolve(places)
+                _count_cache("catalogue_hit")
+                logging.info("CATALOGUE HIT: %d places", len(places))
+                return places, True
+
+            places, complete = await _fetch_candidates(
+                _, q_lat, q_lon, q_radius, lang_code,
+                fsq_api_key, mapbox_token, vietmap_api_key, http,
+                on_update=on_update,
+            )
+            # Опрошенным тайл считается, только если ответили все провайдеры
+            await place_catalogue.upsert(redis_conn, places, area if complete else None)
+            return places, complete
+
+        return fetch
+
+    # 🔹 1. CACHE READ — L1 в памяти, затем один MGET по всем бакетам
+    with metrics.stage(metrics.STAGE_CACHE_READ):
+        entry = await _read_cached_tile(redis_conn, tile_keys, buckets)
+
+    if entry is not None:
+        key, (bucket, precision), places, ts = entry
+        age = time.time() - ts
+        if age < CACHE_TTL:
+            _count_cache("hit")
+            logging.info("CACHE HIT %s", key)
+        else:
+            _count_cache("stale")
+            logging.info("CACHE STALE %s (%.0fs) → background refresh", key, age)
+            _schedule_refresh(redis_conn, key, tile_fetcher(bucket, precision))
+        return _select(places, lat, lon, radius, min_rating, max_rating)
+
+    _count_cache("miss")
+    logging.info("CACHE MISS → querying providers")
 
-    fsq_task = fsq_find(
-        _,
-        api_key=fsq_api_key,
-        lat=lat,
-        lon=lon,
-        radius=radius,
-        min_rating=min_rating,
-        max_rating=max_rating,
-        lang_code=lang_code,
+    # 🔹 2. SINGLE-FLIGHT LOAD (providers + cache write)
+    bucket, precision = buckets[0]
+    places = await _single_flight(
+        redis_conn, tile_keys[0], tile_fetcher(bucket, precision, with_progress=True),
     )
 
-    mapbox_results, fsq_results = await asyncio.gather(mapbox_task, fsq_task)
+    # 🔹 3. CLIP + FILTER + RANKING
+    return _select(places, lat, lon, radius, min_rating, max_rating)
 
-    merged = mapbox_results + fsq_results
-    merged = _deduplicate(merged)
 
-    # 🔹 3. FALLBACK #1 — расширяем FSQ
-    if len(merged) < 3:
-        logging.info("Fallback: expanding Foursquare search")
+async def _fetch_candidates(
+    _,
+    lat: float,
+    lon: float,
+    radius: int,
+    lang_code: str,
+    fsq_api_key: str,
+    mapbox_token: str,
+    vietmap_api_key: str,
+    http: Optional[ProviderHttp],
+    on_update: Optional[Callable[[List[Place]], None]] = None,
+) -> Tuple[List[Place], bool]:
+    """
+    Нефильтрованный набор кандидатов вокруг точки в пределах бюджета времени:
+    Mapbox + Foursquare сразу, VietMap — спекулятивно, если они медлят
+    или мест мало (см. ProviderScheduler). complete=False — сработал дедлайн.
+    """
 
-        fsq_fallback = await fsq_find(
+    # 🔹 PRIMARY: Mapbox + Foursquare (рейтинг фильтруется на чтении —
+    # тайл общий для всех диапазонов)
+    primaries = {
+        "mapbox": lambda: find_places_mapbox(
+            lat=lat,
+            lon=lon,
+            radius=radius,
+            limit=None,  # по площади круга, см. mapbox_api
+            lang_code=lang_code,
+            access_token=mapbox_token,
+            http=http,
+        ),
+        "foursquare": lambda: fsq_find(
             _,
             api_key=fsq_api_key,
             lat=lat,
@@ -140,40 +616,62 @@ async def search_places(
             min_rating=0.0,
             max_rating=5.0,
             lang_code=lang_code,
-        )
-
-        merged.extend(fsq_fallback)
-        merged = _deduplicate(merged)
-
-    # 🔹 4. FALLBACK #2 — VietMap (локальные места)
-    if len(merged) < 3:
-        logging.info("Fallback: VietMap activated")
+            http=http,
+        ),
+    }
 
-        vietmap_results = await find_places_vietmap(
+    # 🔹 FALLBACK — VietMap (локальные места)
+    fallbacks = {
+        "vietmap": lambda: find_places_vietmap(
             lat=lat,
             lon=lon,
             radius=radius,
             api_key=vietmap_api_key,
-        )
-
-        merged.extend(vietmap_results)
-        merged = _deduplicate(merged)
-
-    # 🔹 5. RANKING
-    ranked = sorted(
-        merged,
-        key=lambda p: _score(p, lat, lon),
-        reverse=True,
-    )
+            http=http,
+        ),
+    }
+
+    # Разомкнутые цепи пропускаем, деградировавших — в конец цепочки;
+    # так же поступаем с провайдерами, у которых кончается квота
+    if http is not None and http.health is not None:
+        primaries, fallbacks = http.health.prioritize(primaries, fallbacks)
+    if http is not None and http.quota is not None:
+        primaries, fallbacks = http.quota.prioritize(primaries, fallbacks)
+
+    if not primaries:
+        if request_priority.get() == PRIORITY_BACKGROUND:
+            # Обновление отменяется — устаревший тайл продолжает отдаваться
+            raise QuotaExceededError("no provider quota left for background refresh")
+        logging.warning("No providers available for search")
+        return [], False
+
+    # Копии одного места от разных провайдеров сливаются по мере ответов
+    scheduler = ProviderScheduler(min_results=MIN_RESULTS, merge=PlaceResolver().add)
+    return await scheduler.run(primaries, fallbacks, on_update=on_update)
+
+
+async def search_places_stream(*args, **kwargs) -> AsyncIterator[Tuple[List[Place], bool]]:
+    """
+    Потоковый поиск: те же аргументы, что у search_places.
+    Выдаёт (ранжированный список, final): промежуточные списки — по мере
+    ответов провайдеров, последний (final=True) — итоговый результат.
+    При попадании в кэш выдаётся сразу один итоговый список.
+    """
+    updates: asyncio.Queue = asyncio.Queue()
+    search = asyncio.ensure_future(search_places(*args, progress=updates.put_nowait, **kwargs))
 
-    # 🔹 6. CACHE WRITE
     try:
-        await redis_conn.setex(
-            cache_key,
-            CACHE_TTL,
-            json.dumps(ranked[:10])  # кешируем больше, чем отдаём
-        )
-    except Exception as e:
-        logging.warning("Cache write failed: %s", e)
-
-    return ranked
+        while not search.done():
+            next_update = asyncio.ensure_future(updates.get())
+            done, _ = await asyncio.wait(
+                {next_update, search}, return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_update in done:
+                yield next_update.result(), False
+            else:
+                next_update.cancel()
+
+        yield search.result(), True
+    finally:
+        if not search.done():
+            search.cancel()
@@ -0,0 +1,299 @@
+# bot/utils/provider_health.py
+# -*- coding: utf-8 -*-
+"""
+Здоровье провайдеров мест: скользящее окно ошибок/латентности и circuit breaker.
+
+Раньше деградировавший Mapbox/VietMap стоил каждому поиску полный таймаут.
+Теперь на каждого провайдера:
+- окно последних вызовов (WINDOW секунд): доля ошибок, p50/p95 латентности;
+- при доле ошибок >= OPEN_ERROR_RATE цепь размыкается на COOLDOWN секунд —
+  провайдер пропускается;
+- после паузы — half-open: одна пробная попытка на все реплики;
+  успех замыкает цепь, ошибка размыкает снова; прерванная проба
+  (отмена, исключение) считается ошибкой и освобождает резерв пробы;
+- состояние цепи общее для реплик через Redis (health:circuit:{provider});
+- «нездоровые» провайдеры уходят в конец цепочки search_places (prioritize).
+
+Вызовы учитываются в ProviderHttp.get — провайдерам ничего знать не нужно.
+"""
+
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+WINDOW = 60.0              # окно статистики, секунды
+MIN_CALLS = 5              # меньше вызовов в окне — выводов не делаем
+OPEN_ERROR_RATE = 0.5      # доля ошибок, размыкающая цепь
+COOLDOWN = 30.0            # сколько цепь разомкнута, секунды
+PROBE_TIMEOUT_MS = 15_000  # резерв пробной попытки half-open
+SYNC_INTERVAL = 1.0        # как часто подтягивать состояние цепей из Redis
+
+# Пороги «деградации» — провайдер ещё вызывается, но в последнюю очередь
+DEGRADED_ERROR_RATE = 0.25
+DEGRADED_P95 = 2.0         # секунды
+
+_INSTANCE_ID = uuid.uuid4().hex
+
+_RELEASE_PROBE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Цепь провайдера разомкнута — запрос не отправлялся."""
+
+
+@dataclass
+class _ProviderState:
+    calls: Deque[Tuple[float, bool, float]] = field(default_factory=deque)  # (ts, ok, latency)
+    open_until: float = 0.0
+    probing: bool = False
+
+    def trim(self, now: float) -> None:
+        while self.calls and self.calls[0][0] < now - WINDOW:
+            self.calls.popleft()
+
+    def error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _ts, ok, _lat in self.calls if not ok) / len(self.calls)
+
+    def latency(self, q: float) -> Optional[float]:
+        if not self.calls:
+            return None
+        values = sorted(lat for _ts, _ok, lat in self.calls)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class ProviderHealth:
+    """
+    Трекер здоровья провайдеров. Один экземпляр на процесс (создаётся в main.py).
+    """
+
+    def __init__(self, redis_conn=None):
+        self.redis = redis_conn
+        self._states: Dict[str, _ProviderState] = {}
+        self._last_sync = 0.0
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._states.get(provider)
+        if state is None:
+            state = self._states[provider] = _ProviderState()
+        return state
+
+    # --- Redis: общее состояние цепей ---
+
+    async def _sync(self) -> None:
+        now = time.time()
+        if self.redis is None or not self._states or now - self._last_sync < SYNC_INTERVAL:
+            return
+        self._last_sync = now
+
+        providers = list(self._states)
+        try:
+            values = await self.redis.mget([f"health:circuit:{p}" for p in providers])
+        except Exception as e:
+            logging.warning("Provider health sync failed: %s", e)
+            return
+
+        for provider, value in zip(providers, values):
+            if value is None:
+                continue  # ключ истёк — локальное состояние решает (half-open)
+            state = self._states[provider]
+            remote_until = float(value)
+            if remote_until == 0.0:
+                if state.open_until and not state.probing:
+                    self._close(state)  # другая реплика успешно проверила провайдера
+            elif remote_until > state.open_until:
+                state.open_until = remote_until
+
+    async def _publish(self, provider: str, open_until: float) -> None:
+        if self.redis is None:
+            return
+        key = f"health:circuit:{provider}"
+        try:
+            if open_until:
+                await self.redis.set(key, open_until, px=int(COOLDOWN * 1000))
+            else:
+                await self.redis.set(key, 0, ex=int(WINDOW))
+        except Exception as e:
+            logging.warning("Provider health publish failed: %s", e)
+
+    # --- Circuit breaker ---
+
+    @staticmethod
+    def _close(state: _ProviderState) -> None:
+        state.open_until = 0.0
+        state.probing = False
+        state.calls.clear()
+
+    async def allow(self, provider: str) -> bool:
+        """Можно ли сейчас звать провайдера (closed или пробный вызов half-open)."""
+        state = self._state(provider)
+        await self._sync()
+
+        now = time.time()
+        if not state.open_until:
+            return True
+        if state.open_until > now or state.probing:
+            return False
+
+        # Half-open: одна пробная попытка на все реплики
+        if self.redis is not None:
+            try:
+                reserved = await self.redis.set(
+                    f"health:probe:{provider}", _INSTANCE_ID, nx=True, px=PROBE_TIMEOUT_MS,
+                )
+            except Exception:
+                reserved = True
+            if not reserved:
+                return False
+
+        state.probing = True
+        logging.info("Circuit %s half-open: probing", provider)
+        return True
+
+    async def record(self, provider: str, ok: bool, latency: float) -> None:
+        """Учитывает результат вызова провайдера."""
+        state = self._state(provider)
+        now = time.time()
+
+        if state.probing:
+            if ok:
+                logging.info("Circuit %s closed", provider)
+                self._close(state)
+                await self._publish(provider, 0.0)
+            else:
+                state.probing = False
+                await self._open(provider, state, now)
+            await self._release_probe(provider)
+            return
+
+        state.calls.append((now, ok, latency))
+        state.trim(now)
+
+        if (
+            not state.open_until
+            and len(state.calls) >= MIN_CALLS
+            and state.error_rate() >= OPEN_ERROR_RATE
+        ):
+            await self._open(provider, state, now)
+
+    async def abort(self, provider: str) -> None:
+        """
+        Вызов прерван до ответа (отмена задачи, исключение вне httpx).
+        Обычный вызов не учитывается — хеджирование отменяет медленные запросы
+        постоянно. Прерванная проба half-open считается неудачной: иначе probing
+        так и остаётся True, allow() больше не пускает ни одного запроса,
+        а цепь не замыкается никогда.
+        """
+        state = self._states.get(provider)
+        if state is None or not state.probing:
+            return
+        # Состояние меняется до первого await — отмена посреди записи в Redis его не потеряет
+        state.probing = False
+        state.open_until = time.time() + COOLDOWN
+        logging.warning("Circuit %s probe aborted: open for %.0fs", provider, COOLDOWN)
+        await self._publish(provider, state.open_until)
+        await self._release_probe(provider)
+
+    async def skip(self, provider: str) -> None:
+        """
+        allow() пропустил вызов, но он не отправлен (например, кончилась квота).
+        Проба half-open не состоялась — цепь остаётся half-open, резерв снимается.
+        """
+        state = self._states.get(provider)
+        if state is None or not state.probing:
+            return
+        state.probing = False
+        await self._release_probe(provider)
+
+    async def _release_probe(self, provider: str) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.redis.eval(_RELEASE_PROBE_LUA, 1, f"health:probe:{provider}", _INSTANCE_ID)
+        except Exception as e:
+            logging.warning("Provider probe release failed: %s", e)
+
+    async def _open(self, provider: str, state: _ProviderState, now: float) -> None:
+        state.open_until = now + COOLDOWN
+        logging.warning(
+            "Circuit %s open for %.0fs (error rate %.0f%%)",
+            provider, COOLDOWN, state.error_rate() * 100,
+        )
+        await self._publish(provider, state.open_until)
+
+    # --- Приоритеты для search_places ---
+
+    def is_open(self, provider: str) -> bool:
+        state = self._states.get(provider)
+        return bool(state and state.open_until > time.time())
+
+    def is_degraded(self, provider: str) -> bool:
+        state = self._states.get(provider)
+        if state is None:
+            return False
+        state.trim(time.time())
+        if len(state.calls) < MIN_CALLS:
+            return False
+        p95 = state.latency(0.95) or 0.0
+        return state.error_rate() >= DEGRADED_ERROR_RATE or p95 >= DEGRADED_P95
+
+    def prioritize(self, primaries: Dict[str, Any], fallbacks: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Перестраивает цепочку провайдеров:
+        - с разомкнутой цепью — пропускаются;
+        - деградировавшие — уходят в fallback-и;
+        - если кого-то из основных нет — здоровые fallback-и становятся основными.
+        """
+        healthy = {n: f for n, f in primaries.items() if not self.is_open(n) and not self.is_degraded(n)}
+        if len(healthy) == len(primaries):
+            return primaries, {n: f for n, f in fallbacks.items() if not self.is_open(n)}
+
+        demoted: Dict[str, Any] = {}
+        for name, factory in list(primaries.items()) + list(fallbacks.items()):
+            if name in healthy or self.is_open(name):
+                continue
+            if self.is_degraded(name):
+                demoted[name] = factory
+            else:
+                healthy[name] = factory
+
+        skipped = [n for n in list(primaries) + list(fallbacks) if self.is_open(n)]
+        if skipped:
+            logging.info("Skipping providers with open circuit: %s", ", ".join(skipped))
+        if not healthy:
+            return demoted, {}
+        return healthy, demoted
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Доля ошибок, p50/p95 и состояние цепи по каждому провайдеру."""
+        now = time.time()
+        result = {}
+        for provider, state in self._states.items():
+            state.trim(now)
+            if state.probing:
+                circuit = "half_open"
+            elif state.open_until > now:
+                circuit = "open"
+            elif state.open_until:
+                circuit = "half_open"
+            else:
+                circuit = "closed"
+            result[provider] = {
+                "calls": len(state.calls),
+                "error_rate": round(state.error_rate(), 3),
+                "p50": state.latency(0.5),
+                "p95": state.latency(0.95),
+                "circuit": circuit,
+            }
+        return result
@@ -0,0 +1,160 @@
+# bot/utils/provider_scheduler.py
+# -*- coding: utf-8 -*-
+"""
+Планировщик запросов к провайдерам мест с общим бюджетом времени.
+
+Раньше поиск ждал Mapbox + FSQ (до 10 с каждый), потом последовательно
+fallback-и — в «пустом» районе это 30+ секунд на экране «ищем».
+Теперь:
+- основные провайдеры стартуют сразу;
+- fallback-и стартуют спекулятивно (hedge), если основные медлят
+  дольше HEDGE_AFTER или первые ответы выглядят скудно;
+- как только основные ответили и мест достаточно — незавершённые
+  fallback-и отменяются;
+- по дедлайну возвращается то, что успели собрать (partial);
+- on_update получает промежуточный набор после каждого ответа провайдера
+  (прогрессивная выдача — places_service.search_places_stream).
+
+Длительность, исход и число мест каждого вызова — в метриках
+(metrics.observe_provider).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bot.utils import metrics
+from bot.utils.place import Place
+
+SEARCH_BUDGET = 4.0   # общий бюджет на загрузку кандидатов, секунды
+HEDGE_AFTER = 1.5     # через сколько запускать fallback-и, если основные не ответили
+
+ProviderFactory = Callable[[], Awaitable[List[Place]]]
+
+
+class ProviderScheduler:
+    """
+    Запускает провайдеров по правилам выше и сливает их ответы.
+    run() возвращает (кандидаты, complete): complete=False — сработал дедлайн.
+    """
+
+    def __init__(
+        self,
+        budget: float = SEARCH_BUDGET,
+        hedge_after: float = HEDGE_AFTER,
+        min_results: int = 3,
+        merge: Optional[Callable[[List[Place]], List[Place]]] = None,
+    ):
+        """
+        merge — получает ответ очередного провайдера и возвращает весь слитый
+        набор (PlaceResolver.add); без него ответы просто склеиваются.
+        """
+        self.budget = budget
+        self.hedge_after = hedge_after
+        self.min_results = min_results
+        self.merge = merge
+
+    async def run(
+        self,
+        primaries: Dict[str, ProviderFactory],
+        fallbacks: Optional[Dict[str, ProviderFactory]] = None,
+        on_update: Optional[Callable[[List[Place]], None]] = None,
+    ) -> Tuple[List[Place], bool]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.budget
+        hedge_at = started + self.hedge_after
+        fallbacks = dict(fallbacks or {})
+
+        # task → (имя провайдера, это fallback?)
+        pending: Dict[asyncio.Task, Tuple[str, bool]] = {}
+
+        def launch(calls: Dict[str, ProviderFactory], is_fallback: bool) -> None:
+            for name, factory in calls.items():
+                pending[asyncio.ensure_future(_timed(name, is_fallback, factory))] = (name, is_fallback)
+
+        launch(primaries, is_fallback=False)
+        fallbacks_started = not fallbacks
+        primaries_answered = 0
+        merged: List[Place] = []
+        timed_out = False
+
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    timed_out = True
+                    break
+
+                wait_for = deadline - now
+                if not fallbacks_started:
+                    wait_for = min(wait_for, max(hedge_at - now, 0.0))
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                for task in done:
+                    name, is_fallback = pending.pop(task)
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        logging.error("Provider %s failed: %s", name, e)
+                        results = []
+                    logging.info(
+                        "Provider %s: %d places in %.2fs",
+                        name, len(results), loop.time() - started,
+                    )
+                    if not is_fallback:
+                        primaries_answered += 1
+                    merged = self.merge(results) if self.merge is not None else merged + results
+
+                if on_update is not None and pending and merged:
+                    on_update(merged)
+
+                primaries_pending = any(not fb for _name, fb in pending.values())
+
+                if not fallbacks_started:
+                    slow = primaries_pending and loop.time() >= hedge_at
+                    sparse = primaries_answered > 0 and len(merged) < self.min_results
+                    if slow or sparse:
+                        logging.info(
+                            "Fallback: starting %s (%s)",
+                            ", ".join(fallbacks), "slow primaries" if slow else "sparse results",
+                        )
+                        launch(fallbacks, is_fallback=True)
+                        fallbacks_started = True
+
+                # Основные ответили и мест хватает — fallback-и больше не нужны
+                if not primaries_pending and len(merged) >= self.min_results:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                names = ", ".join(name for name, _fb in pending.values())
+                logging.info("Cancelled outstanding providers: %s", names)
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if timed_out:
+            logging.warning(
+                "Search budget %.1fs exhausted: returning %d partial places",
+                self.budget, len(merged),
+            )
+        return merged, not timed_out
+
+
+async def _timed(name: str, is_fallback: bool, factory: ProviderFactory) -> List[Place]:
+    """Вызов провайдера с замером для metrics.observe_provider."""
+    started = time.perf_counter()
+    outcome, count = "error", None
+    try:
+        results = await factory()
+        outcome, count = "ok", len(results)
+        return results
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        metrics.observe_provider(name, is_fallback, outcome, time.perf_counter() - started, count)
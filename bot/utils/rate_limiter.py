@@ -0,0 +1,186 @@
+# bot/utils/rate_limiter.py
+# -*- coding: utf-8 -*-
+"""
+Учёт квот провайдеров мест: token bucket + дневная квота в Redis.
+
+Foursquare даёт жёсткий дневной бюджет запросов, а каждый поиск стоит
+3 запроса FSQ (по одному на категорию CATEGORY_MAP). Теперь каждый запрос
+к провайдеру проходит через ProviderQuota.acquire (в ProviderHttp.get):
+- token bucket на провайдера (rate/burst) — общий для всех реплик;
+- дневная квота — счётчик quota:daily:{provider}:{date};
+- обе проверки — одним атомарным Lua-скриптом;
+- фоновые запросы (обновление устаревших тайлов) не трогают резерв
+  RESERVE дневной квоты — он остаётся пользовательским поискам;
+- когда квоты мало, провайдер уходит в fallback-и, когда она кончилась —
+  пропускается (prioritize), а устаревший кэш продолжает отдаваться.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+# Приоритет текущих запросов к провайдерам; фоновые задачи выставляют BACKGROUND
+request_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "request_priority", default=PRIORITY_INTERACTIVE,
+)
+
+RESERVE = 0.2          # доля дневной квоты, недоступная фоновым запросам
+LOW_WATERMARK = 0.2    # ниже этой доли провайдер уходит в fallback-и
+MAX_WAIT = 1.0         # сколько интерактивный запрос ждёт токен, секунды
+DAILY_KEY_TTL = 2 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class ProviderLimit:
+    rate: float   # токенов в секунду
+    burst: int    # ёмкость ведра
+    daily: int    # дневная квота запросов; 0 — без лимита
+
+
+# Лимиты по умолчанию; дневную квоту FSQ можно переопределить (FSQ_DAILY_QUOTA)
+DEFAULT_LIMITS: Dict[str, ProviderLimit] = {
+    "foursquare": ProviderLimit(rate=5.0, burst=15, daily=1000),
+    "mapbox": ProviderLimit(rate=10.0, burst=30, daily=3000),
+    "vietmap": ProviderLimit(rate=5.0, burst=10, daily=0),
+}
+
+# Возвращает {status, remaining, wait_ms}: status 1 — ок, 0 — ведро пусто, -1 — квота
+_ACQUIRE_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local daily = tonumber(ARGV[5])
+local reserve = tonumber(ARGV[6])
+local daily_ttl = tonumber(ARGV[7])
+
+local used = tonumber(redis.call('GET', KEYS[2]) or '0')
+if daily > 0 and used + cost > daily - reserve then
+    return {-1, daily - used, 0}
+end
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+if tokens < cost then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    return {0, daily - used, math.ceil((cost - tokens) / rate * 1000)}
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens - cost, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+used = redis.call('INCRBY', KEYS[2], cost)
+redis.call('EXPIRE', KEYS[2], daily_ttl)
+return {1, daily - used, 0}
+"""
+
+
+class QuotaExceededError(httpx.RequestError):
+    """Квота или rate limit провайдера исчерпаны — запрос не отправлялся."""
+
+
+class ProviderQuota:
+    """
+    Распределённый rate limiter и учёт дневных квот. Один экземпляр на процесс.
+    """
+
+    def __init__(self, redis_conn, limits: Optional[Dict[str, ProviderLimit]] = None):
+        self.redis = redis_conn
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self._script = redis_conn.register_script(_ACQUIRE_LUA)
+        # Последний известный остаток дневной квоты: provider → (день, остаток)
+        self._remaining: Dict[str, Tuple[str, int]] = {}
+
+    @staticmethod
+    def daily_key(provider: str, day: Optional[str] = None) -> str:
+        return f"quota:daily:{provider}:{day or date.today().isoformat()}"
+
+    async def acquire(self, provider: str, cost: int = 1, priority: Optional[str] = None) -> bool:
+        """
+        Списывает cost запросов. Интерактивный запрос ждёт токен до MAX_WAIT,
+        фоновый — не ждёт и не трогает резерв дневной квоты.
+        """
+        limit = self.limits.get(provider)
+        if limit is None:
+            return True
+
+        priority = priority or request_priority.get()
+        background = priority == PRIORITY_BACKGROUND
+        reserve = int(limit.daily * RESERVE) if background else 0
+        deadline = time.monotonic() + (0.0 if background else MAX_WAIT)
+
+        while True:
+            try:
+                status, remaining, wait_ms = await self._script(
+                    keys=[f"quota:bucket:{provider}", self.daily_key(provider)],
+                    args=[limit.rate, limit.burst, time.time(), cost, limit.daily, reserve, DAILY_KEY_TTL],
+                )
+            except Exception as e:
+                logging.warning("Quota check failed for %s: %s", provider, e)
+                return True  # Redis недоступен — не блокируем поиск
+
+            if limit.daily:
+                self._remaining[provider] = (date.today().isoformat(), int(remaining))
+
+            if status == 1:
+                return True
+            if status == -1:
+                logging.warning("%s daily quota exhausted for %s requests", provider, priority)
+                return False
+
+            wait = int(wait_ms) / 1000
+            if time.monotonic() + wait > deadline:
+                logging.warning("%s rate limited (%s)", provider, priority)
+                return False
+            await asyncio.sleep(wait)
+
+    def remaining_share(self, provider: str) -> float:
+        """Доля оставшейся дневной квоты (1.0 — без лимита или ещё неизвестно)."""
+        limit = self.limits.get(provider)
+        day, remaining = self._remaining.get(provider, (None, 0))
+        if limit is None or not limit.daily or day != date.today().isoformat():
+            return 1.0
+        return max(remaining, 0) / limit.daily
+
+    def prioritize(
+        self,
+        primaries: Dict[str, Any],
+        fallbacks: Dict[str, Any],
+        priority: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Исчерпавшие квоту провайдеры пропускаются (для фоновых — уже с резервом),
+        провайдеры с остатком ниже LOW_WATERMARK уходят в fallback-и.
+        """
+        background = (priority or request_priority.get()) == PRIORITY_BACKGROUND
+        floor = RESERVE if background else 0.0
+
+        kept: Dict[str, Any] = {}
+        demoted: Dict[str, Any] = {}
+        for name, factory in list(primaries.items()) + list(fallbacks.items()):
+            share = self.remaining_share(name)
+            if share <= floor:
+                logging.info("Skipping %s: daily quota exhausted", name)
+            elif name in primaries and share < LOW_WATERMARK:
+                demoted[name] = factory
+            elif name in primaries:
+                kept[name] = factory
+            else:
+                demoted[name] = factory
+
+        if not kept:
+            return demoted, {}
+        return kept, demoted
@@ -0,0 +1,184 @@
+# bot/utils/update_context.py
+# -*- coding: utf-8 -*-
+"""
+Контекст апдейта: язык, FSM-состояние и FSM-данные одним походом в Redis.
+
+Раньше каждый апдейт платил GET user_lang:{id} в I18nMiddleware,
+GET состояния в FSMContextMiddleware и ещё по GET данных на каждый
+state.get_data() в хендлерах (process_and_send_results — повторно),
+а запись языка шла отдельными SET в Redis и в FSM.
+Теперь:
+- UpdateContextMiddleware (bot/middlewares/context.py) в начале апдейта
+  читает всё три ключа одним pipeline (load);
+- UpdateScopedStorage отдаёт состояние и данные из этой памяти и копит
+  изменения — до конца апдейта в Redis ничего не пишется;
+- в конце апдейта изменённые поля записываются одним pipeline (flush).
+Итого 1–2 обращения к Redis на апдейт вместо 3–5.
+
+Вне апдейта (или для чужого ключа) хранилище работает как обычный RedisStorage.
+С клиентским кэшем (utils/client_cache.py) язык берётся из памяти процесса,
+и в pipeline остаются только ключи FSM.
+"""
+
+import contextvars
+from typing import Any, Dict, Mapping, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from bot.utils.client_cache import TrackedCache
+
+LANG_KEY = "user_lang:{user_id}"
+
+
+class UpdateContext:
+    """Прочитанные в начале апдейта значения и список изменённых полей."""
+
+    __slots__ = ("key", "user_id", "lang", "state", "data", "dirty")
+
+    def __init__(
+        self,
+        key: Optional[StorageKey],
+        user_id: Optional[int],
+        lang: Optional[str] = None,
+        state: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ):
+        self.key = key
+        self.user_id = user_id
+        self.lang = lang
+        self.state = state
+        self.data = data or {}
+        self.dirty: Set[str] = set()
+
+    def set_lang(self, lang_code: str) -> None:
+        """Язык пользователя (user_lang:{id}) — запишется в конце апдейта."""
+        self.lang = lang_code
+        self.dirty.add("lang")
+
+
+_current: contextvars.ContextVar[Optional[UpdateContext]] = contextvars.ContextVar(
+    "update_context", default=None,
+)
+
+
+def current_context() -> Optional[UpdateContext]:
+    return _current.get()
+
+
+class UpdateScopedStorage(BaseStorage):
+    """
+    Обёртка над RedisStorage: внутри апдейта состояние/данные его ключа
+    берутся из UpdateContext и пишутся в Redis один раз в flush().
+    """
+
+    def __init__(self, inner: RedisStorage, lang_cache: Optional[TrackedCache] = None):
+        self.inner = inner
+        self.redis = inner.redis
+        self.lang_cache = lang_cache
+
+    def _scoped(self, key: StorageKey) -> Optional[UpdateContext]:
+        ctx = _current.get()
+        if ctx is not None and ctx.key == key:
+            return ctx
+        return None
+
+    # --- Жизненный цикл апдейта ---
+
+    async def load(self, key: Optional[StorageKey], user_id: Optional[int]) -> UpdateContext:
+        """Язык, состояние и данные одним pipeline (язык — из клиентского кэша, если есть)."""
+        ctx = UpdateContext(key, user_id)
+        lang_key = LANG_KEY.format(user_id=user_id) if user_id is not None else None
+        cached, epoch = False, 0
+        if lang_key is not None and self.lang_cache is not None:
+            cached, ctx.lang = self.lang_cache.get(lang_key)
+            epoch = self.lang_cache.begin_fill()
+
+        pipe = self.redis.pipeline(transaction=False)
+        if lang_key is not None and not cached:
+            pipe.get(lang_key)
+        if key is not None:
+            pipe.get(self.inner.key_builder.build(key, "state"))
+            pipe.get(self.inner.key_builder.build(key, "data"))
+        values = list(await pipe.execute()) if len(pipe) else []
+
+        if lang_key is not None and not cached:
+            ctx.lang = _decode(values.pop(0))
+            if self.lang_cache is not None:
+                self.lang_cache.fill(lang_key, ctx.lang, epoch)
+        if key is not None:
+            ctx.state = _decode(values.pop(0))
+            raw = _decode(values.pop(0))
+            ctx.data = self.inner.json_loads(raw) if raw else {}
+        return ctx
+
+    def activate(self, ctx: UpdateContext) -> contextvars.Token:
+        return _current.set(ctx)
+
+    def deactivate(self, token: contextvars.Token) -> None:
+        _current.reset(token)
+
+    async def flush(self, ctx: UpdateContext) -> None:
+        """Изменённые за апдейт поля — одним pipeline."""
+        if not ctx.dirty:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        if "lang" in ctx.dirty and ctx.user_id is not None:
+            lang_key = LANG_KEY.format(user_id=ctx.user_id)
+            pipe.set(lang_key, ctx.lang)
+            if self.lang_cache is not None:
+                # Своя запись: не ждём push-инвалидацию от Redis
+                self.lang_cache.invalidate([lang_key])
+        if "state" in ctx.dirty:
+            state_key = self.inner.key_builder.build(ctx.key, "state")
+            if ctx.state is None:
+                pipe.delete(state_key)
+            else:
+                pipe.set(state_key, ctx.state, ex=self.inner.state_ttl)
+        if "data" in ctx.dirty:
+            data_key = self.inner.key_builder.build(ctx.key, "data")
+            if not ctx.data:
+                pipe.delete(data_key)
+            else:
+                pipe.set(data_key, self.inner.json_dumps(ctx.data), ex=self.inner.data_ttl)
+        await pipe.execute()
+        ctx.dirty.clear()
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        ctx = self._scoped(key)
+        if ctx is None:
+            return await self.inner.set_state(key, state)
+        ctx.state = state.state if isinstance(state, State) else state
+        ctx.dirty.add("state")
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        ctx = self._scoped(key)
+        if ctx is None:
+            return await self.inner.get_state(key)
+        return ctx.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        ctx = self._scoped(key)
+        if ctx is None:
+            return await self.inner.set_data(key, data)
+        ctx.data = dict(data)
+        ctx.dirty.add("data")
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        ctx = self._scoped(key)
+        if ctx is None:
+            return await self.inner.get_data(key)
+        return dict(ctx.data)
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+
+def _decode(value: Any) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -1,9 +1,11 @@
 # bot/utils/vietmap_api.py
 
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-import httpx
+from bot.utils import codec
+from bot.utils.http_client import ProviderHttp, provider_get
+from bot.utils.place import Place
 
 
 async def find_places_vietmap(
@@ -11,7 +13,8 @@ async def find_places_vietmap(
     lon: float,
     radius: int,
     api_key: str,
-) -> List[Dict[str, Any]]:
+    http: Optional[ProviderHttp] = None,
+) -> List[Place]:
     """
     VietMap Places API (fallback для Вьетнама)
     """
@@ -26,14 +29,13 @@ async def find_places_vietmap(
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, params=params, timeout=10.0)
+        r = await provider_get(http, "vietmap", url, params=params)
 
         if not r.is_success:
             logging.error("VietMap error: %s %s", r.status_code, r.text[:200])
             return []
 
-        data = r.json()
+        data = codec.json_loads(r.content)
         results = data.get("data", [])
 
         return [_normalize(p) for p in results]
@@ -43,22 +45,13 @@ async def find_places_vietmap(
         return []
 
 
-def _normalize(p: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        "place_id": p.get("id"),
-        "name": p.get("name"),
-        "rating": None,  # VietMap часто без рейтинга
-        "user_ratings_total": 0,
-        "types": [],
-        "primary_type": "local_place",
-        "lat": p.get("lat"),
-        "lon": p.get("lng"),
-        "vicinity": p.get("address"),
-        "price_level": None,
-        "business_status": "OPERATIONAL",
-        "opening_hours": None,
-        "photos": [],
-        "icon": None,
-        "icon_background_color": None,
-        "permanently_closed": None,
-    }
+def _normalize(p: Dict[str, Any]) -> Place:
+    # VietMap часто без рейтинга
+    return Place(
+        place_id=p.get("id"),
+        name=p.get("name"),
+        primary_type="local_place",
+        lat=p.get("lat"),
+        lon=p.get("lng"),
+        vicinity=p.get("address"),
+    )
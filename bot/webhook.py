@@ -0,0 +1,148 @@
+# bot/webhook.py
+# -*- coding: utf-8 -*-
+"""
+Webhook-режим (BOT_MODE=webhook) — альтернатива long polling.
+
+- Telegram присылает апдейты POST-ом на WEBHOOK_URL + WEBHOOK_PATH;
+  заголовок X-Telegram-Bot-Api-Secret-Token сверяется с WEBHOOK_SECRET.
+- aiohttp-приложение отвечает сразу, апдейт обрабатывается в фоне.
+- WEBHOOK_WORKERS > 1 — несколько процессов на одном порту (SO_REUSEPORT):
+  ядро раскидывает соединения по процессам, всё состояние (FSM, кэш,
+  квоты, circuit breaker'ы) и так общее через Redis.
+- Вебхук регистрируется один раз мастер-процессом и без drop_pending_updates —
+  накопившиеся за деплой апдейты не теряются.
+- GET HEALTH_PATH: 200, пока в обработке меньше WEBHOOK_MAX_INFLIGHT апдейтов,
+  иначе 503 — балансировщик обходит занятую реплику.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from bot.config import settings
+from bot.middlewares.inflight import InflightMiddleware
+
+HEALTH_PATH = "/healthz"
+
+
+async def register_webhook() -> None:
+    """setWebhook один раз на все процессы; pending-апдейты сохраняются."""
+    bot = Bot(token=settings.BOT_TOKEN)
+    try:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=False,
+        )
+    finally:
+        await bot.session.close()
+    logging.info("Webhook registered: %s%s", settings.WEBHOOK_URL, settings.WEBHOOK_PATH)
+
+
+def _health_handler(inflight: InflightMiddleware, worker: int):
+    async def health(request: web.Request) -> web.Response:
+        busy = inflight.inflight >= settings.WEBHOOK_MAX_INFLIGHT
+        return web.json_response(
+            {
+                "status": "busy" if busy else "ok",
+                "worker": worker,
+                "pid": os.getpid(),
+                "inflight": inflight.inflight,
+                "handled": inflight.total,
+            },
+            status=503 if busy else 200,
+        )
+
+    return health
+
+
+async def serve(worker: int = 0, reuse_port: bool = False) -> None:
+    """Один процесс webhook-сервера; работает до SIGTERM/SIGINT."""
+    from bot.main import bot_context  # main импортирует этот модуль
+
+    async with bot_context(worker) as (bot, dp):
+        inflight = InflightMiddleware()
+        dp.update.outer_middleware(inflight)
+
+        app = web.Application()
+        app.router.add_get(HEALTH_PATH, _health_handler(inflight, worker))
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=settings.WEBHOOK_SECRET or None,
+        ).register(app, path=settings.WEBHOOK_PATH)
+        setup_application(app, dp, bot=bot)
+
+        runner = web.AppRunner(app, handle_signals=False)
+        await runner.setup()
+        site = web.TCPSite(
+            runner, settings.WEBAPP_HOST, settings.WEBAPP_PORT, reuse_port=reuse_port,
+        )
+        await site.start()
+        logging.info(
+            "Webhook worker %d (pid %d) listening on %s:%d",
+            worker, os.getpid(), settings.WEBAPP_HOST, settings.WEBAPP_PORT,
+        )
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()
+
+
+def _worker(worker: int) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+    )
+    asyncio.run(serve(worker, reuse_port=True))
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def run() -> None:
+    """Точка входа webhook-режима: регистрация вебхука и запуск процессов."""
+    if not settings.WEBHOOK_URL:
+        raise RuntimeError("BOT_MODE=webhook requires WEBHOOK_URL")
+    if not settings.WEBHOOK_SECRET:
+        logging.warning("WEBHOOK_SECRET is empty: webhook requests are not authenticated")
+
+    asyncio.run(register_webhook())
+
+    workers = max(settings.WEBHOOK_WORKERS, 1)
+    if workers == 1:
+        asyncio.run(serve())
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_worker, args=(i,), name=f"webhook-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # docker stop → SIGTERM мастеру; воркеры останавливаем сами
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()